@@ -1,6 +1,7 @@
 const { pool } = require("./db");
 const { sendWhatsApp, sendWhatsAppImage } = require("./whatsapp");
 const { spawn } = require("child_process");
+const { runEngine } = require("./engineWorker");
 const fs = require("fs");
 const path = require("path");
 
@@ -43,46 +44,16 @@ async function runPythonBackTestEngine(symbol, strategy, startDate, endDate) {
   });
 }
 
-// --- Helper to run Python engine and parse JSON ---
+// --- Helper to run Python engine via the persistent worker pool ---
 function runPythonEngine(message) {
-  return new Promise((resolve) => {
-    const enginePath = path.join(__dirname, "../python/engine.py");
-
-    const py = spawn("python3", [enginePath, message], {
-      env: process.env
-    });
-
-    let output = "";
-
-    py.stdout.on("data", data => {
-      output += data.toString();
-    });
-
-    py.stderr.on("data", err => {
-      console.error("Python log:", err.toString());
-    });
-
-    py.on("close", code => {
-      if (code === 0) {
-        try {
-          const match = output.match(/\{[\s\S]*\}$/);
-
-          if (!match) {
-            console.error("No JSON found in output:", output);
-            return resolve(null);
-          }
-
-          const json = JSON.parse(match[0]);
-          resolve(json);
-        } catch (e) {
-          console.error("Python JSON parse error:", e);
-          console.error("Raw output:", output);
-          resolve(null);
-        }
-      } else {
-        resolve(null);
-      }
-    });
+  // Accept either a raw message or CLI-style args: [symbol, "--entry", price]
+  const args = Array.isArray(message) ? message : [message];
+  const entryIndex = args.indexOf("--entry");
+  const entry = entryIndex >= 0 ? args[entryIndex + 1] : undefined;
+
+  return runEngine(args[0], entry).catch(err => {
+    console.error("Python engine error:", err);
+    return null;
   });
 }
 async function processBacktest(symbol, strategy, startDate, endDate) {
@@ -0,0 +1,119 @@
+const { spawn } = require("child_process");
+const path = require("path");
+
+// ---------------------- Persistent Python Engine Workers ----------------------
+// Each worker is one long-lived `engine.py --serve` process speaking
+// newline-delimited JSON; requests carry an id so responses may arrive out of order.
+const enginePath = path.join(__dirname, "../python/engine.py");
+const POOL_SIZE = Number(process.env.ENGINE_POOL_SIZE || 1);
+const THREADS_PER_WORKER = Number(process.env.ENGINE_WORKERS || 4);
+const REQUEST_TIMEOUT_MS = Number(process.env.ENGINE_TIMEOUT_MS || 120000);
+// A dead worker is respawned after RESPAWN_DELAY_MS, doubling per consecutive failure
+const RESPAWN_DELAY_MS = 1000;
+const MAX_RESPAWN_DELAY_MS = 30000;
+
+const workers = [];
+const failures = [];
+let nextId = 1;
+let nextWorker = 0;
+
+// Reject everything in flight, free the slot and schedule a fresh worker.
+// Safe to call more than once ("error" and "close" can both fire).
+function failWorker(slot, worker, reason) {
+  if (worker.dead) return;
+  worker.dead = true;
+  console.error(`Engine worker ${slot} failed: ${reason}`);
+
+  for (const entry of worker.pending.values()) {
+    clearTimeout(entry.timer);
+    entry.reject(`Python engine worker failed: ${reason}`);
+  }
+  worker.pending.clear();
+  if (workers[slot] !== worker) return;
+  workers[slot] = null;
+
+  failures[slot] = (failures[slot] || 0) + 1;
+  const delay = Math.min(RESPAWN_DELAY_MS * 2 ** (failures[slot] - 1), MAX_RESPAWN_DELAY_MS);
+  setTimeout(() => {
+    if (!workers[slot]) startWorker(slot);
+  }, delay).unref();
+}
+
+function startWorker(slot) {
+  const py = spawn("python3", [enginePath, "--serve", "--workers", String(THREADS_PER_WORKER)], {
+    env: process.env
+  });
+
+  const worker = { py, pending: new Map(), buffer: "", dead: false };
+
+  // Spawn failures (e.g. python3 missing) and writes to a crashed worker (EPIPE)
+  py.on("error", err => failWorker(slot, worker, err.message));
+  py.stdin.on("error", err => failWorker(slot, worker, err.message));
+
+  py.stdout.on("data", data => {
+    worker.buffer += data.toString();
+    let newline;
+    while ((newline = worker.buffer.indexOf("\n")) >= 0) {
+      const line = worker.buffer.slice(0, newline).trim();
+      worker.buffer = worker.buffer.slice(newline + 1);
+      if (!line) continue;
+
+      let message;
+      try {
+        message = JSON.parse(line);
+      } catch (e) {
+        console.error("Engine worker sent invalid JSON:", line);
+        continue;
+      }
+
+      failures[slot] = 0;
+      const entry = worker.pending.get(String(message.id));
+      if (!entry) continue;
+      worker.pending.delete(String(message.id));
+      clearTimeout(entry.timer);
+
+      if (message.error) entry.reject(message.error);
+      else entry.resolve(message.result);
+    }
+  });
+
+  py.stderr.on("data", data => {
+    console.error("Python log:", data.toString());
+  });
+
+  py.on("close", code => failWorker(slot, worker, `exited with code ${code}`));
+
+  workers[slot] = worker;
+  return worker;
+}
+
+function getWorker() {
+  const slot = nextWorker;
+  nextWorker = (nextWorker + 1) % POOL_SIZE;
+  return workers[slot] || startWorker(slot);
+}
+
+// Send one request to a warm engine worker; resolves with the engine result.
+function requestEngine(payload) {
+  return new Promise((resolve, reject) => {
+    const worker = getWorker();
+    const id = String(nextId++);
+
+    const timer = setTimeout(() => {
+      worker.pending.delete(id);
+      reject(`Python engine request ${id} timed out`);
+    }, REQUEST_TIMEOUT_MS);
+
+    worker.pending.set(id, { resolve, reject, timer });
+    worker.py.stdin.write(JSON.stringify({ id, ...payload }) + "\n");
+  });
+}
+
+// Convenience wrapper matching the engine.py CLI arguments.
+function runEngine(symbol, entry) {
+  const payload = { symbol };
+  if (entry) payload.entry = Number(entry);
+  return requestEngine(payload);
+}
+
+module.exports = { requestEngine, runEngine };
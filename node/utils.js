@@ -1,39 +1,11 @@
-const { spawn } = require("child_process");
-const path = require("path");
+const { runEngine } = require("./engineWorker");
 
 // ---------------------- Run Python Engine ----------------------
+// CLI-style args ([symbol, "--entry", price]) sent to the persistent engine worker
 function runPythonEngine(args) {
-  return new Promise((resolve, reject) => {
-    const enginePath = path.join(__dirname, "../python/engine.py");
-
-    const py = spawn("python3", [enginePath, ...args], {
-      env: process.env
-    });
-
-    let output = "";
-    let error = "";
-
-    py.stdout.on("data", data => {
-      output += data.toString();
-    });
-
-    py.stderr.on("data", data => {
-      error += data.toString();
-    });
-
-    py.on("close", code => {
-      if (code !== 0) {
-        console.error("Python error:", error);
-        return reject(error);
-      }
-
-      try {
-        resolve(JSON.parse(output));
-      } catch (e) {
-        reject("Invalid Python JSON output");
-      }
-    });
-  });
+  const entryIndex = args.indexOf("--entry");
+  const entry = entryIndex >= 0 ? args[entryIndex + 1] : undefined;
+  return runEngine(args[0], entry);
 }
 
 // ---------------------- Build WhatsApp / PWA Message ----------------------
@@ -1,132 +1,838 @@
+import os
+import re
 import sys
 import json
+import math
+import argparse
+import itertools
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
 import numpy as np
-import yfinance as yf
+import ohlcv_store
+import backtest_cache
+
+# Exponential average along the bar axis (adjust=False), optionally seeded
+# with `first` instead of the first value. A 2-D input is bars x paths and is
+# solved SMOOTH_BLOCK bars at a time: inside a block the recursion unrolls to
+# a lower-triangular weight matrix times the block plus the decayed carry-in.
+SMOOTH_BLOCK = 32
+
+
+def _smooth(values, alpha, first=None):
+    if first is not None:
+        values = values.copy()
+        values[0] = first
+    if values.ndim == 1:
+        return pd.Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    decay = 1 - alpha
+    steps = np.arange(SMOOTH_BLOCK)
+    lag = steps[:, np.newaxis] - steps
+    weights = np.where(lag >= 0, alpha * decay ** np.maximum(lag, 0), 0.0)
+    carry = (decay ** (steps + 1))[:, np.newaxis]
+    out = np.empty_like(values)
+    out[0] = values[0]
+    for start in range(1, len(values), SMOOTH_BLOCK):
+        block = values[start:start + SMOOTH_BLOCK]
+        size = len(block)
+        out[start:start + size] = weights[:size, :size] @ block + carry[:size] * out[start - 1]
+    return out
+
+
+# Wilder smoothing: seeded with the simple mean of the first `period` moves,
+# then an exponential average with alpha = 1 / period. Returns the average
+# gain and loss for bars period .. end.
+def _wilder_averages(prices, period):
+    deltas = np.diff(prices, axis=0)
+    gains = np.maximum(deltas, 0)
+    losses = gains - deltas
+    return tuple(
+        _smooth(moves[period - 1:], 1.0 / period, first=moves[:period].mean(axis=0))
+        for moves in (gains, losses)
+    )
 
 # Function to calculate the Relative Strength Index (RSI)
+# rsi[i] only uses prices up to bar i; the first `period` values are NaN.
+# Works on a single series or on a bars x paths matrix.
 def calculate_rsi(prices, period=14):
+    prices = np.asarray(prices, dtype=float)
     # Ensure the length of prices is large enough to calculate RSI
-    if len(prices) < period:
+    if len(prices) <= period:
         return np.array([])  # Return empty array if not enough data
-    
-    deltas = np.diff(prices)
-    gains = np.where(deltas > 0, deltas, 0)
-    losses = np.where(deltas < 0, -deltas, 0)
-
-    avg_gain = np.mean(gains[:period])
-    avg_loss = np.mean(losses[:period])
-
-    if avg_loss == 0:
-        rsi = np.ones(len(prices)) * 100  # RSI = 100 when no losses
-    else:
-        rsi = []
-        for i in range(period, len(prices)):
-            gain = gains[i]
-            loss = losses[i]
 
-            avg_gain = (avg_gain * (period - 1) + gain) / period
-            avg_loss = (avg_loss * (period - 1) + loss) / period
-
-            rs = avg_gain / avg_loss if avg_loss != 0 else 100
-            rsi_value = 100 - (100 / (1 + rs))
-            rsi.append(rsi_value)
+    avg_gain, avg_loss = _wilder_averages(prices, period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.where(avg_loss == 0, 100.0, 100 - (100 / (1 + avg_gain / avg_loss)))
 
     # Return the full RSI series with initial NaNs for the first 'period' values
-    rsi = [np.nan] * period + rsi
-    return np.array(rsi)
+    return np.concatenate([np.full((period,) + prices.shape[1:], np.nan), rsi])
 
 # Function to fetch historical stock data from Yahoo Finance
+# Daily bars are read through the local OHLCV store, which only downloads
+# the bars it does not have yet.
 def fetch_historical_data(symbol, start_date, end_date):
     try:
-        stock_data = yf.download(symbol, start=start_date, end=end_date)
+        stock_data = ohlcv_store.get_bars(symbol, interval="1d", start=start_date, end=end_date)
+        if stock_data.empty:
+            return pd.DataFrame()
         stock_data = stock_data[['Close']]  # We're interested in the closing prices
+        stock_data.index = stock_data.index.tz_localize(None).rename('Date')
         stock_data.reset_index(inplace=True)  # Reset the index to make 'Date' a column
         return stock_data
     except Exception as e:
         print(f"Error fetching data for {symbol}: {e}")
         return pd.DataFrame()  # Return empty DataFrame on error
 
-# Function to perform backtest dynamically using RSI
-def perform_backtest(symbol, strategy, start_date, end_date):
+# ------------------- Backtest Kernel -------------------
+INITIAL_BALANCE = 10000
+EMPTY_RESULT = {
+    "profit": 0.0,
+    "winRate": 0.0,
+    "maxDrawdown": 0.0,
+    "sharpeRatio": 0.0
+}
+
+
+def _match_lifo(buy, sell, held=0):
+    """
+    Execute one-share trades without a cash limit: every buy signal opens a
+    position, every sell signal closes the most recent open one. `held`
+    positions are already open before bar 0; they appear as entry bar -d,
+    d being the 1-based stack depth (bottom first).
+    Returns (buy bars that executed, entry bars, exit bars, bars of the
+    positions still open at the end, bottom of the stack first).
+    """
+    step = buy.astype(np.int64) - sell.astype(np.int64)
+    # Sells with nothing open are skipped: position is the walk reflected at 0
+    walk = held + np.cumsum(step)
+    floor = np.minimum(np.minimum.accumulate(walk), 0)
+    position = walk - floor
+    prev = np.concatenate([[held], position[:-1]])
+
+    buys = np.flatnonzero(buy)
+    sells = np.flatnonzero(sell & (prev > 0))
+    carried = np.arange(1, held + 1)
+
+    # Stack depth of each push / pop. At one depth pushes and pops alternate,
+    # so each pop pairs with the push just before it in (depth, bar) order.
+    depth = np.concatenate([carried, position[buys], prev[sells]])
+    bars = np.concatenate([-carried, buys, sells])
+    is_sell = np.concatenate([np.zeros(held + len(buys), bool), np.ones(len(sells), bool)])
+    order = np.lexsort((bars, depth))
+    depth, bars, is_sell = depth[order], bars[order], is_sell[order]
+    pops = np.flatnonzero(is_sell)
+    entries = bars[pops - 1]
+    exits = bars[pops]
+
+    # A depth is still occupied when its last event is a push
+    last = np.flatnonzero(np.concatenate([depth[1:] != depth[:-1], [True]])) if len(depth) else pops
+    still_open = bars[last][~is_sell[last]]
+
+    by_exit = np.argsort(exits, kind="stable")
+    return buys, entries[by_exit], exits[by_exit], still_open
+
+
+def _simulate_loop(close, buy, sell, balance, held=0):
+    """
+    Bar-by-bar fallback used when the cash check skips a buy, which makes
+    the outcome path dependent. Only signal bars are visited.
+    """
+    positions = [-d for d in range(1, held + 1)]
+    entries, exits, buys = [], [], []
+    for i in np.flatnonzero(buy | sell):
+        price = close[i]
+        if buy[i]:
+            if balance > price:
+                balance -= price
+                positions.append(i)
+                buys.append(i)
+        elif positions:
+            entries.append(positions.pop())
+            exits.append(i)
+            balance += price
+    as_array = lambda v: np.asarray(v, dtype=np.int64)
+    return as_array(buys), as_array(entries), as_array(exits), as_array(positions), balance
+
+
+def _trade(close, buy, sell, balance, held=0):
+    """
+    simulate_trades plus the state needed to continue later: returns
+    (buys, entries, exits, open position bars, cash balance).
+    """
+    close = np.asarray(close, dtype=float)
+    buy, sell = np.asarray(buy, bool), np.asarray(sell, bool) & ~np.asarray(buy, bool)
+    buys, entries, exits, still_open = _match_lifo(buy, sell, held)
+
+    # Cash before each executed buy, assuming nothing was skipped
+    flow = np.zeros(len(close))
+    np.add.at(flow, buys, -close[buys])
+    np.add.at(flow, exits, close[exits])
+    cash_before = balance + np.cumsum(flow) - flow
+    if np.all(cash_before[buys] > close[buys]):
+        return buys, entries, exits, still_open, balance + flow.sum()
+    return _simulate_loop(close, buy, sell, balance, held)
+
+
+def simulate_trades(close, buy, sell, initial_balance=INITIAL_BALANCE):
+    """
+    One share per signal, LIFO exits, buys only while cash exceeds the price.
+    Returns (executed buy bars, entry bars, exit bars); trades are ordered
+    by exit bar.
+    """
+    return _trade(close, buy, sell, initial_balance)[:3]
+
+
+def compute_metrics(profits, initial_balance=INITIAL_BALANCE):
+    """
+    Aggregate metrics from per-trade profits in exit order. Drawdown is
+    measured against the running peak of realized equity. Sharpe keeps the
+    original definition: mean over std of the changes between successive
+    realized equity values, so the first trade only sets the starting level.
+    """
+    profits = np.asarray(profits, dtype=float)
+    if len(profits) == 0:
+        return dict(EMPTY_RESULT)
+
+    equity = initial_balance + np.concatenate([[0.0], np.cumsum(profits)])
+    peak = np.maximum.accumulate(equity)
+    max_drawdown = np.max((peak - equity) / peak) * 100
+
+    returns = profits[1:]
+    volatility = np.std(returns) if len(returns) else 0
+    sharpe_ratio = np.mean(returns) / volatility if volatility != 0 else 0
+
+    return {
+        "profit": round(float(profits.sum()), 2),
+        "winRate": round(float((profits > 0).mean() * 100), 2),
+        "maxDrawdown": round(float(max_drawdown), 2),
+        "sharpeRatio": round(float(sharpe_ratio), 2)
+    }
+
+
+def run_backtest(close, buy, sell, dates=None, initial_balance=INITIAL_BALANCE, log_trades=False):
+    """
+    Backtest precomputed signals over a close array. Returns the metrics dict;
+    trades are written to stderr when `log_trades` is set.
+    """
+    close = np.asarray(close, dtype=float)
+    buys, entries, exits = simulate_trades(close, buy, sell, initial_balance)
+    profits = close[exits] - close[entries]
+
+    if log_trades:
+        label = (lambda i: dates[i]) if dates is not None else (lambda i: i)
+        events = sorted(
+            [(i, f"Buy at {label(i)}: {close[i]}") for i in buys] +
+            [(i, f"Sell at {label(i)}: {close[i]} - Profit: {p}") for i, p in zip(exits, profits)]
+        )
+        for _, line in events:
+            print(line, file=sys.stderr)
+
+    return compute_metrics(profits, initial_balance)
+
+# ------------------- Strategies -------------------
+# Each strategy maps a close array and its parameters to buy / sell signal
+# masks for run_backtest. Bar 0 and each strategy's warm-up never trade.
+# Closes may also be a bars x paths matrix (see montecarlo.py).
+def _ema(values, span):
+    return _smooth(values, 2.0 / (span + 1))
+
+
+def _crossings(fast, slow, warmup):
+    above = fast > slow
+    prev = np.zeros_like(above)
+    prev[1:] = above[:-1]
+    buy = above & ~prev
+    sell = ~above & prev
+    buy[:max(1, warmup)] = sell[:max(1, warmup)] = False
+    return buy, sell
+
+
+def rsi_signals(close, period=14, oversold=30, overbought=70):
+    """
+    Buy below `oversold`, sell above `overbought`.
+    """
+    close = np.asarray(close, dtype=float)
+    buy = np.zeros(close.shape, dtype=bool)
+    sell = np.zeros(close.shape, dtype=bool)
+    if len(close) <= period:
+        return buy, sell
+
+    # RSI < x  <=>  avg_gain * (100 - x) < avg_loss * x, without building the
+    # RSI itself; RSI is 100 when there are no losses
+    avg_gain, avg_loss = _wilder_averages(close, period)
+    buy[period:] = avg_gain * (100 - oversold) < avg_loss * oversold
+    sell[period:] = (avg_gain * (100 - overbought) > avg_loss * overbought) | (avg_loss == 0)
+    buy[:1] = sell[:1] = False
+    return buy, sell
+
+
+def ema_crossover_signals(close, fast=12, slow=26):
+    """
+    Buy when the fast EMA crosses above the slow EMA, sell when it crosses back.
+    """
+    close = np.asarray(close, dtype=float)
+    return _crossings(_ema(close, fast), _ema(close, slow), slow)
+
+
+def macd_signals(close, fast=12, slow=26, signal=9):
+    """
+    Buy when the MACD line crosses above its signal line, sell when it crosses back.
+    """
+    close = np.asarray(close, dtype=float)
+    line = _ema(close, fast) - _ema(close, slow)
+    return _crossings(line, _ema(line, signal), slow + signal)
+
+
+STRATEGIES = {
+    "rsi": {"signals": rsi_signals, "params": {"period": 14, "oversold": 30, "overbought": 70}},
+    "ema_crossover": {"signals": ema_crossover_signals, "params": {"fast": 12, "slow": 26}},
+    "macd": {"signals": macd_signals, "params": {"fast": 12, "slow": 26, "signal": 9}},
+}
+DEFAULT_STRATEGY = "rsi"
+STRATEGY_KEYWORDS = [("macd", "macd"), ("ema", "ema_crossover"), ("cross", "ema_crossover"), ("rsi", "rsi")]
+
+
+def _number(text):
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+
+def parse_strategy(spec):
+    """
+    Turn a strategy argument into (name, params).
+
+    Accepts a registry name with optional overrides ("rsi",
+    "macd:fast=8,slow=21") or the free text the web form sends ("RSI < 30",
+    "EMA crossover"), where "<" / ">" numbers set the RSI thresholds.
+    Anything unrecognised falls back to the default RSI rule.
+    """
+    text = (spec or "").strip().lower()
+    name, _, overrides = text.partition(":")
+    name = name.strip().replace(" ", "_").replace("-", "_")
+
+    if name in STRATEGIES:
+        params = dict(STRATEGIES[name]["params"])
+        for item in filter(None, (part.strip() for part in overrides.split(","))):
+            key, _, value = item.partition("=")
+            key = key.strip()
+            if key not in params:
+                raise ValueError(f"Unknown parameter '{key}' for strategy '{name}'")
+            params[key] = _number(value)
+        return name, params
+
+    name = next((target for keyword, target in STRATEGY_KEYWORDS if keyword in text), DEFAULT_STRATEGY)
+    params = dict(STRATEGIES[name]["params"])
+    if name == "rsi":
+        below = re.search(r"<\s*(\d+(?:\.\d+)?)", text)
+        above = re.search(r">\s*(\d+(?:\.\d+)?)", text)
+        if below:
+            params["oversold"] = _number(below.group(1))
+        if above:
+            params["overbought"] = _number(above.group(1))
+    return name, params
+
+
+def strategy_signals(name, close, params):
+    strategy = STRATEGIES.get(name)
+    if strategy is None:
+        raise ValueError(f"Unknown strategy '{name}'. Available: {', '.join(STRATEGIES)}")
+    return strategy["signals"](close, **params)
+
+# ------------------- Cached Backtests -------------------
+def cached_backtest(symbol, name, params, stamps, close):
+    """
+    run_backtest through the result cache: reuses the longest cached prefix
+    of these bars and simulates only the bars after it. Signals are still
+    computed over the whole range so indicators match a full run.
+    """
+    bars, state = backtest_cache.find_prefix(symbol, name, params, stamps, close)
+    if state is not None and bars == len(close):
+        # Recomputed so a stored result follows the current metric definitions
+        return compute_metrics(state["profits"])
+
+    state = state or {"balance": INITIAL_BALANCE, "open": [], "profits": []}
+    buy, sell = strategy_signals(name, close, params)
+    new_close = close[bars:]
+    _, entries, exits, still_open, balance = _trade(
+        new_close, buy[bars:], sell[bars:], state["balance"], held=len(state["open"])
+    )
+
+    # Entry bar -d refers to the d-th position carried over from the prefix
+    held = len(state["open"])
+    prices = np.concatenate([np.asarray(state["open"], dtype=float), new_close])
+    price_of = lambda idx: prices[np.where(idx >= 0, idx + held, -idx - 1)]
+
+    profits = state["profits"] + (new_close[exits] - price_of(entries)).tolist()
+    result = compute_metrics(profits)
+    backtest_cache.store(symbol, name, params, stamps, close, {
+        "balance": float(balance),
+        "open": price_of(still_open).tolist(),
+        "profits": profits,
+        "result": result
+    })
+    return result
+
+# Function to perform backtest with the requested strategy
+def perform_backtest(symbol, strategy, start_date, end_date, log_trades=False, use_cache=True):
+    name, params = parse_strategy(strategy)
     data = fetch_historical_data(symbol, start_date, end_date)
 
     # Check if data is empty or too small to calculate RSI
-    if data.empty or len(data) < 14:
-        print(f"Not enough data to perform backtest for {symbol} from {start_date} to {end_date}")
-        return json.dumps({
-            "profit": 0.0,
-            "winRate": 0.0,
-            "maxDrawdown": 0.0,
-            "sharpeRatio": 0.0
-        })
+    if data.empty or len(data) <= 14:
+        print(f"Not enough data to perform backtest for {symbol} from {start_date} to {end_date}", file=sys.stderr)
+        return json.dumps(EMPTY_RESULT)
+
+    close = data['Close'].to_numpy(dtype=float)
+    if use_cache and not log_trades:
+        stamps = data['Date'].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        return json.dumps(cached_backtest(symbol, name, params, stamps, close))
+
+    buy, sell = strategy_signals(name, close, params)
+    result = run_backtest(close, buy, sell, dates=data['Date'], log_trades=log_trades)
+    return json.dumps(result)
+
+# ------------------- Parameter Sweep -------------------
+# History is loaded once per symbol in the parent and written to two .npy
+# files (closes and timestamps for every symbol, back to back). Workers
+# memory-map them, so every process reads the same pages and tasks only
+# carry row offsets.
+SWEEP_WORKERS = int(os.getenv("BACKTEST_WORKERS", os.cpu_count() or 1))
+LOWER_IS_BETTER = {"maxDrawdown"}
 
-    rsi_values = calculate_rsi(data['Close'].values, period=14)
-    if rsi_values.size == 0:
-        print("RSI calculation failed due to insufficient data.")
-        return json.dumps({
-            "profit": 0.0,
-            "winRate": 0.0,
-            "maxDrawdown": 0.0,
-            "sharpeRatio": 0.0
+_panel = None  # (closes, stamps) memmaps in sweep workers
+
+
+def load_panel(symbols, start_date, end_date):
+    """
+    Daily closes for every symbol over [start_date, end_date), one fetch per
+    symbol. Returns (closes, stamps, {symbol: (lo, hi)}).
+    """
+    closes, stamps, offsets, pos = [], [], {}, 0
+    for symbol in symbols:
+        data = fetch_historical_data(symbol, start_date, end_date)
+        if data.empty:
+            print(f"No data for {symbol} from {start_date} to {end_date}", file=sys.stderr)
+            continue
+        closes.append(data['Close'].to_numpy(dtype=float))
+        stamps.append(data['Date'].to_numpy(dtype="datetime64[ns]").astype(np.int64))
+        offsets[symbol] = (pos, pos + len(data))
+        pos += len(data)
+
+    if not offsets:
+        return np.empty(0), np.empty(0, dtype=np.int64), offsets
+    return np.concatenate(closes), np.concatenate(stamps), offsets
+
+
+def _share(*arrays):
+    """
+    Write arrays to temporary .npy files for the workers to memory-map.
+    """
+    paths = []
+    for array in arrays:
+        handle, path = tempfile.mkstemp(prefix="backtest-panel-", suffix=".npy")
+        with os.fdopen(handle, "wb") as f:
+            np.save(f, array)
+        paths.append(path)
+    return paths
+
+
+def _attach(*paths):
+    global _panel
+    _panel = tuple(np.load(path, mmap_mode="r") for path in paths)
+
+
+def _attach_arrays(*arrays):
+    global _panel
+    _panel = arrays
+
+
+def _sweep_task(task):
+    """
+    Run every parameter set of one task on its (symbol, range) slice.
+    """
+    closes = _panel[0]
+    close = np.asarray(closes[task["lo"]:task["hi"]])
+    results = []
+    for params in task["params"]:
+        if len(close) <= 14:
+            metrics = dict(EMPTY_RESULT)
+        else:
+            buy, sell = strategy_signals(task["strategy"], close, params)
+            metrics = run_backtest(close, buy, sell)
+        results.append({
+            "symbol": task["symbol"],
+            "start": task["start"],
+            "end": task["end"],
+            "strategy": task["strategy"],
+            "params": params,
+            **metrics
         })
+    return task["group"], results
 
-    data['RSI'] = rsi_values
-    initial_balance = 10000
-    balance = initial_balance
-    positions = []  # To track open trades
-    profits = []  # To track profits from each closed trade
-
-    for i in range(1, len(data)):
-        if data['RSI'].iloc[i] < 30 and balance > data['Close'].iloc[i]:
-            balance -= data['Close'].iloc[i]
-            positions.append(data['Close'].iloc[i])  # Store buy price
-            print(f"Buy at {data['Date'].iloc[i]}: {data['Close'].iloc[i]}")
-        
-        elif data['RSI'].iloc[i] > 70 and len(positions) > 0:
-            buy_price = positions.pop()
-            profit = data['Close'].iloc[i] - buy_price
-            balance += data['Close'].iloc[i]
-            profits.append(profit)
-            print(f"Sell at {data['Date'].iloc[i]}: {data['Close'].iloc[i]} - Profit: {profit}")
-    
-    total_profit = sum(profits)
-    win_trades = len([p for p in profits if p > 0])
-    total_trades = len(profits)
-    win_rate = (win_trades / total_trades) * 100 if total_trades > 0 else 0
-
-    portfolio_values = [initial_balance + sum(profits[:i+1]) for i in range(len(profits))]
-    max_drawdown = (max(portfolio_values) - min(portfolio_values)) / max(portfolio_values) * 100 if len(portfolio_values) > 0 else 0
-
-    returns = np.diff([initial_balance + sum(profits[:i+1]) for i in range(len(profits))])  
-    if len(returns) > 0:
-        average_return = np.mean(returns)
-        volatility = np.std(returns)
-        sharpe_ratio = average_return / volatility if volatility != 0 else 0
-    else:
-        sharpe_ratio = 0
-    
-    result = {
-        "profit": round(total_profit, 2),
-        "winRate": round(win_rate, 2),
-        "maxDrawdown": round(max_drawdown, 2),
-        "sharpeRatio": round(sharpe_ratio, 2)
+
+def run_tasks(fn, tasks, arrays, workers=SWEEP_WORKERS):
+    """
+    Run fn(task) for every task with `arrays` visible to it as the shared
+    panel. Uses a process pool when there is more than one worker and task;
+    yields results in completion order.
+    """
+    if workers <= 1 or len(tasks) <= 1:
+        _attach_arrays(*arrays)
+        for task in tasks:
+            yield fn(task)
+        return
+
+    paths = _share(*arrays)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=tuple(paths)) as pool:
+            futures = [pool.submit(fn, task) for task in tasks]
+            for future in as_completed(futures):
+                yield future.result()
+    finally:
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def rank_results(results, rank_by="sharpeRatio"):
+    """
+    Best first by `rank_by`; ties keep a fixed strategy / params order so the
+    ranking does not depend on the order tasks finished in.
+    """
+    results = sorted(results, key=lambda r: (r["strategy"], sorted(r["params"].items())))
+    return sorted(results, key=lambda r: r.get(rank_by, 0.0), reverse=rank_by not in LOWER_IS_BETTER)
+
+
+def expand_grid(strategy, grid):
+    """
+    Every parameter combination of `grid` ({param: [values]}) applied over
+    the strategy defaults. Grid keys the strategy does not take are ignored.
+    """
+    defaults = STRATEGIES[strategy]["params"]
+    keys = [key for key in grid if key in defaults]
+    combos = []
+    for values in itertools.product(*(grid[key] for key in keys)):
+        params = dict(defaults, **dict(zip(keys, values)))
+        combos.append(params)
+    return combos
+
+
+def sweep(symbols, strategies, grid, ranges, workers=SWEEP_WORKERS, rank_by="sharpeRatio"):
+    """
+    Backtest every strategy / parameter combination on every symbol and
+    (start, end) range in a process pool.
+
+    Yields results one (symbol, range) group at a time, as soon as the group
+    is complete, ranked best first by `rank_by` with a 1-based "rank".
+    """
+    start_all = min(start for start, _ in ranges)
+    end_all = max(end for _, end in ranges)
+    closes, stamps, offsets = load_panel(symbols, start_all, end_all)
+
+    combos = {name: expand_grid(name, grid) for name in strategies}
+    tasks, pending = [], {}
+    for symbol, (lo, hi) in offsets.items():
+        symbol_stamps = stamps[lo:hi]
+        for start, end in ranges:
+            a = lo + int(np.searchsorted(symbol_stamps, pd.Timestamp(start).value))
+            b = lo + int(np.searchsorted(symbol_stamps, pd.Timestamp(end).value))
+            group = (symbol, start, end)
+            for name in strategies:
+                # Split large grids so a single symbol still uses every worker
+                size = max(1, math.ceil(len(combos[name]) * len(offsets) * len(ranges) / (workers * 4)))
+                for i in range(0, len(combos[name]), size):
+                    tasks.append({"group": group, "symbol": symbol, "start": start, "end": end,
+                                  "lo": a, "hi": b, "strategy": name, "params": combos[name][i:i + size]})
+                    pending[group] = pending.get(group, 0) + 1
+
+    collected = {}
+
+    def finish(group, results):
+        collected.setdefault(group, []).extend(results)
+        pending[group] -= 1
+        if pending[group]:
+            return []
+        ranked = rank_results(collected.pop(group), rank_by)
+        return [dict(result, rank=i + 1) for i, result in enumerate(ranked)]
+
+    for group, results in run_tasks(_sweep_task, tasks, (closes, stamps), workers):
+        yield from finish(group, results)
+
+
+def parse_grid(items):
+    """
+    ["period=10,14,21", "oversold=25,30"] -> {"period": [10, 14, 21], "oversold": [25, 30]}
+    """
+    grid = {}
+    for item in items or []:
+        key, _, values = item.partition("=")
+        grid[key.strip()] = [_number(v) for v in values.split(",") if v.strip()]
+    return grid
+
+
+def parse_range(text):
+    start, _, end = text.partition(":")
+    if not start or not end:
+        raise argparse.ArgumentTypeError(f"Expected START:END, got '{text}'")
+    return start, end
+
+# ------------------- Walk-Forward -------------------
+# Rolling windows over each symbol's history: the best parameter set on the
+# train window is traded on the following test window, then both move
+# forward by the test length. Windows run in parallel on the shared panel.
+OFFSET_UNITS = {"d": "days", "w": "weeks", "mo": "months", "m": "months", "y": "years"}
+
+
+def parse_offset(text):
+    """
+    "90d", "6mo", "2y" -> pd.DateOffset
+    """
+    match = re.fullmatch(r"(\d+)\s*(d|w|mo|m|y)", (text or "").strip().lower())
+    if not match:
+        raise argparse.ArgumentTypeError(f"Expected a length like 90d, 6mo or 2y, got '{text}'")
+    return pd.DateOffset(**{OFFSET_UNITS[match.group(2)]: int(match.group(1))})
+
+
+def walk_forward_windows(stamps, train, test):
+    """
+    (train_lo, test_lo, test_hi) row positions into `stamps` (ns, sorted)
+    for each rolling window. The last test window may be shorter.
+    """
+    if not len(stamps):
+        return []
+    first, last = pd.Timestamp(stamps[0]), pd.Timestamp(stamps[-1])
+    windows, start = [], first
+    while start + train <= last:
+        test_start = start + train
+        lo, mid, hi = np.searchsorted(stamps, [start.value, test_start.value, (test_start + test).value])
+        if hi > mid:
+            windows.append((int(lo), int(mid), int(hi)))
+        start = start + test
+    return windows
+
+
+def _walk_forward_task(task):
+    """
+    Pick the best parameters on the train rows, then trade them on the test
+    rows. Signals are computed over train + test so indicators are warm when
+    the test window opens.
+    """
+    closes, stamps = _panel
+    lo, mid, hi = task["lo"], task["mid"], task["hi"]
+    close = np.asarray(closes[lo:hi])
+    train = close[:mid - lo]
+
+    scored = []
+    for params in task["params"]:
+        metrics = dict(EMPTY_RESULT)
+        if len(train) > 14:
+            buy, sell = strategy_signals(task["strategy"], train, params)
+            metrics = run_backtest(train, buy, sell)
+        scored.append({"strategy": task["strategy"], "params": params, **metrics})
+    best = rank_results(scored, task["rank_by"])[0]
+
+    buy, sell = strategy_signals(task["strategy"], close, best["params"])
+    offset = mid - lo
+    test_close, test_buy, test_sell = close[offset:], buy[offset:], sell[offset:]
+    test_buy[:1] = test_sell[:1] = False
+    _, entries, exits = simulate_trades(test_close, test_buy, test_sell)
+    profits = test_close[exits] - test_close[entries]
+
+    day = lambda i: str(pd.Timestamp(int(stamps[i])).date())
+    return {
+        "symbol": task["symbol"],
+        "window": task["window"],
+        "train": [day(lo), day(mid - 1)],
+        "test": [day(mid), day(hi - 1)],
+        "strategy": task["strategy"],
+        "params": best["params"],
+        "train_metrics": {key: best[key] for key in EMPTY_RESULT},
+        "test_metrics": compute_metrics(profits),
+        "test_profits": profits.tolist(),
     }
 
-    return json.dumps(result)
+
+def walk_forward(symbols, strategy, grid, start_date, end_date, train, test,
+                 workers=SWEEP_WORKERS, rank_by="sharpeRatio"):
+    """
+    Walk-forward optimisation of `strategy` over `grid` for each symbol.
+
+    Yields one result per window as it finishes, then one summary per symbol
+    (window == "all") with metrics over the stitched out-of-sample trades.
+    """
+    closes, stamps, offsets = load_panel(symbols, start_date, end_date)
+    combos = expand_grid(strategy, grid)
+
+    tasks, windows = [], {}
+    for symbol, (lo, hi) in offsets.items():
+        spans = walk_forward_windows(stamps[lo:hi], train, test)
+        windows[symbol] = {}
+        for n, (a, b, c) in enumerate(spans):
+            tasks.append({"symbol": symbol, "window": n, "lo": lo + a, "mid": lo + b, "hi": lo + c,
+                          "strategy": strategy, "params": combos, "rank_by": rank_by})
+        if not spans:
+            print(f"History for {symbol} is shorter than one train + test window", file=sys.stderr)
+
+    remaining = {symbol: sum(1 for t in tasks if t["symbol"] == symbol) for symbol in offsets}
+    for result in run_tasks(_walk_forward_task, tasks, (closes, stamps), workers):
+        symbol = result["symbol"]
+        windows[symbol][result["window"]] = result.pop("test_profits")
+        yield result
+        remaining[symbol] -= 1
+        if not remaining[symbol]:
+            stitched = np.concatenate([windows[symbol][n] for n in sorted(windows[symbol])] or [[]])
+            yield {"symbol": symbol, "window": "all", "strategy": strategy,
+                   "windows": len(windows[symbol]), "test_metrics": compute_metrics(stitched)}
+
+# ------------------- Portfolio -------------------
+# A basket on one calendar (union of trading days, closes carried forward).
+# Capital is split equally into one sleeve per symbol; a sleeve is fully
+# invested from a buy signal until the next sell signal. Everything is
+# computed on aligned (bars x symbols) arrays.
+TRADING_DAYS = 252
+
+
+def align_panel(closes, stamps, offsets):
+    """
+    (calendar ns stamps, bars x symbols close matrix, symbols). Closes are
+    forward-filled; bars before a symbol's first close are NaN.
+    """
+    symbols = list(offsets)
+    calendar = np.unique(stamps) if len(stamps) else np.empty(0, dtype=np.int64)
+    matrix = np.full((len(calendar), len(symbols)), np.nan)
+    for j, symbol in enumerate(symbols):
+        lo, hi = offsets[symbol]
+        matrix[np.searchsorted(calendar, stamps[lo:hi]), j] = closes[lo:hi]
+    matrix = pd.DataFrame(matrix).ffill().to_numpy()
+    return calendar, matrix, symbols
+
+
+def portfolio_backtest(symbols, strategy, start_date, end_date, initial_balance=INITIAL_BALANCE):
+    """
+    Simulate `strategy` (a parse_strategy spec) on every symbol of the basket.
+    Returns metrics, the daily equity curve, per-symbol attribution and
+    turnover (traded value over average equity).
+    """
+    name, params = parse_strategy(strategy)
+    closes, stamps, offsets = load_panel(symbols, start_date, end_date)
+    calendar, prices, symbols = align_panel(closes, stamps, offsets)
+    if len(calendar) < 2:
+        return {**EMPTY_RESULT, "equity": [], "attribution": {}, "turnover": 0.0}
+
+    bars, count = prices.shape
+    held = np.zeros((bars, count))
+    trades = np.zeros(count, dtype=np.int64)
+    for j in range(count):
+        listed = np.flatnonzero(~np.isnan(prices[:, j]))
+        if len(listed) <= 14:
+            continue
+        first = listed[0]
+        buy, sell = strategy_signals(name, prices[first:, j], params)
+        # +1 on buys, 0 on sells, carried forward between signals
+        state = pd.Series(np.where(buy, 1.0, np.where(sell, 0.0, np.nan))).ffill().fillna(0.0).to_numpy()
+        held[first:, j] = state
+        trades[j] = int(np.count_nonzero(np.diff(np.concatenate([[0.0], state]))))
+
+    # A position decided on bar t earns the move from t to t + 1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        moves = np.nan_to_num(prices[1:] / prices[:-1] - 1)
+    sleeve_returns = held[:-1] * moves
+    sleeves = (initial_balance / count) * np.vstack([np.ones(count), np.cumprod(1 + sleeve_returns, axis=0)])
+    equity = sleeves.sum(axis=1)
+
+    peak = np.maximum.accumulate(equity)
+    max_drawdown = np.max((peak - equity) / peak) * 100
+    returns = np.diff(equity) / equity[:-1]
+    volatility = np.std(returns)
+    sharpe_ratio = np.mean(returns) / volatility * np.sqrt(TRADING_DAYS) if volatility != 0 else 0
+
+    # Value bought or sold whenever a sleeve switches in or out of the market
+    switches = np.abs(np.diff(np.vstack([np.zeros(count), held]), axis=0))
+    traded = (switches * sleeves).sum()
+    profit = equity[-1] - initial_balance
+    pnl = sleeves[-1] - initial_balance / count
+    winning_days = np.count_nonzero(returns > 0)
+    active_days = np.count_nonzero(returns != 0)
+
+    dates = pd.to_datetime(calendar).strftime("%Y-%m-%d")
+    return {
+        "profit": round(float(profit), 2),
+        "winRate": round(float(winning_days / active_days * 100), 2) if active_days else 0.0,
+        "maxDrawdown": round(float(max_drawdown), 2),
+        "sharpeRatio": round(float(sharpe_ratio), 2),
+        "strategy": name,
+        "params": params,
+        "equity": [[d, round(float(v), 2)] for d, v in zip(dates, equity)],
+        "attribution": {
+            symbol: {
+                "profit": round(float(pnl[j]), 2),
+                "share": round(float(pnl[j] / profit * 100), 2) if profit else 0.0,
+                "trades": int(trades[j])
+            }
+            for j, symbol in enumerate(symbols)
+        },
+        "turnover": round(float(traded / equity.mean()), 4)
+    }
 
 def main():
-    if len(sys.argv) != 5:
+    parser = argparse.ArgumentParser(description="Backtest trading strategies")
+    parser.add_argument("args", nargs="*", help="symbol strategy start_date end_date")
+    parser.add_argument("--trades", action="store_true", help="Log every trade to stderr")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore the backtest result cache")
+    parser.add_argument("--sweep", action="store_true", help="Run a parameter sweep, one JSON line per result")
+    parser.add_argument("--symbols", nargs="+", default=[])
+    parser.add_argument("--strategy", action="append", dest="strategies",
+                        help=f"Strategy to sweep (repeatable): {', '.join(STRATEGIES)}")
+    parser.add_argument("--grid", nargs="+", default=[], help="Parameter values, e.g. period=10,14,21 oversold=25,30")
+    parser.add_argument("--range", action="append", dest="ranges", type=parse_range, help="START:END (repeatable)")
+    parser.add_argument("--workers", type=int, default=SWEEP_WORKERS)
+    parser.add_argument("--rank-by", default="sharpeRatio", choices=list(EMPTY_RESULT))
+    parser.add_argument("--walk-forward", action="store_true", help="Walk-forward optimisation, one JSON line per window")
+    parser.add_argument("--train", type=parse_offset, default=parse_offset("2y"), help="Train window length (default 2y)")
+    parser.add_argument("--test", type=parse_offset, default=parse_offset("6mo"), help="Test window length (default 6mo)")
+    parser.add_argument("--portfolio", action="store_true", help="Backtest --symbols as one equal-weight basket")
+    options = parser.parse_args()
+
+    if options.walk_forward or options.portfolio:
+        if not options.symbols or not options.ranges or len(options.ranges) != 1:
+            parser.error("--walk-forward and --portfolio need --symbols and exactly one --range")
+        (start_date, end_date), = options.ranges
+        strategy = (options.strategies or [DEFAULT_STRATEGY])[0]
+        if options.portfolio:
+            print(json.dumps(portfolio_backtest(options.symbols, strategy, start_date, end_date)))
+            return
+        if strategy not in STRATEGIES:
+            parser.error(f"Unknown strategy: {strategy}")
+        results = walk_forward(options.symbols, strategy, parse_grid(options.grid), start_date, end_date,
+                               options.train, options.test, workers=options.workers, rank_by=options.rank_by)
+        for result in results:
+            print(json.dumps(result), flush=True)
+        return
+
+    if options.sweep:
+        if not options.symbols or not options.ranges:
+            parser.error("--sweep needs --symbols and at least one --range")
+        strategies = options.strategies or [DEFAULT_STRATEGY]
+        unknown = [name for name in strategies if name not in STRATEGIES]
+        if unknown:
+            parser.error(f"Unknown strategy: {', '.join(unknown)}")
+        results = sweep(options.symbols, strategies, parse_grid(options.grid), options.ranges,
+                        workers=options.workers, rank_by=options.rank_by)
+        for result in results:
+            print(json.dumps(result), flush=True)
+        return
+
+    if len(options.args) != 4:
         print(json.dumps({"success": False, "error": "Missing arguments. Expected symbol, strategy, start_date, and end_date."}))
         return
     
-    symbol = sys.argv[1]
-    strategy = sys.argv[2]
-    start_date = sys.argv[3]
-    end_date = sys.argv[4]
+    symbol, strategy, start_date, end_date = options.args
 
-    print(f"Performing backtest for {symbol} using strategy {strategy} from {start_date} to {end_date}...")
-    results = perform_backtest(symbol, strategy, start_date, end_date)
+    print(f"Performing backtest for {symbol} using strategy {strategy} from {start_date} to {end_date}...", file=sys.stderr)
+    results = perform_backtest(symbol, strategy, start_date, end_date, log_trades=options.trades,
+                               use_cache=not options.no_cache)
 
     print(results)
 
@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import numpy as np
+from storage import connect
+
+# ------------------- Backtest Result Cache -------------------
+# perform_backtest results keyed by symbol, strategy, parameters and the
+# first bar of the range. Each entry records how many bars it covered, a
+# hash of those bars and the trading state after the last one, so:
+#   same range, same data      -> the stored result is returned as is
+#   longer range, same prefix  -> only the new bars are simulated
+#   re-adjusted history        -> the hash no longer matches, full rerun
+CACHE_TTL = int(os.getenv("BACKTEST_CACHE_TTL", 30 * 24 * 3600))
+MAX_PREFIXES = 8  # stored range lengths kept per symbol / strategy / params / start
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS backtests (
+    symbol TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    params TEXT NOT NULL,
+    start_ts INTEGER NOT NULL,
+    bars INTEGER NOT NULL,
+    data_hash TEXT NOT NULL,
+    state TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (symbol, strategy, params, start_ts, bars)
+);
+"""
+
+
+def _db():
+    return connect("backtests", SCHEMA)
+
+
+def _key(symbol, strategy, params, stamps):
+    return (symbol.upper(), strategy, json.dumps(params, sort_keys=True), int(stamps[0]))
+
+
+def data_hash(stamps, close):
+    """
+    Hash of the bar timestamps (ns) and closes a result was computed from.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(stamps, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(close, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def find_prefix(symbol, strategy, params, stamps, close):
+    """
+    Longest cached run whose bars are an unchanged prefix of (stamps, close).
+    Returns (bar count, state) or (0, None).
+    """
+    if not len(stamps):
+        return 0, None
+    try:
+        rows = _db().execute(
+            "SELECT bars, data_hash, state FROM backtests "
+            "WHERE symbol = ? AND strategy = ? AND params = ? AND start_ts = ? AND bars <= ? AND created_at > ? "
+            "ORDER BY bars DESC",
+            (*_key(symbol, strategy, params, stamps), len(stamps), time.time() - CACHE_TTL)
+        ).fetchall()
+    except Exception as e:
+        logging.warning(f"Backtest cache read failed: {e}")
+        return 0, None
+
+    for bars, stored_hash, state in rows:
+        if data_hash(stamps[:bars], close[:bars]) == stored_hash:
+            return bars, json.loads(state)
+    return 0, None
+
+
+def store(symbol, strategy, params, stamps, close, state):
+    """
+    Save the state after the last bar of (stamps, close) and drop expired
+    entries and all but the longest MAX_PREFIXES runs for this key.
+    """
+    if not len(stamps):
+        return
+    key = _key(symbol, strategy, params, stamps)
+    try:
+        db = _db()
+        db.execute("BEGIN")
+        db.execute(
+            "INSERT OR REPLACE INTO backtests "
+            "(symbol, strategy, params, start_ts, bars, data_hash, state, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (*key, len(stamps), data_hash(stamps, close), json.dumps(state), time.time())
+        )
+        db.execute(
+            "DELETE FROM backtests WHERE symbol = ? AND strategy = ? AND params = ? AND start_ts = ? AND bars NOT IN ("
+            "SELECT bars FROM backtests WHERE symbol = ? AND strategy = ? AND params = ? AND start_ts = ? "
+            "ORDER BY bars DESC LIMIT ?)",
+            (*key, *key, MAX_PREFIXES)
+        )
+        db.execute("DELETE FROM backtests WHERE created_at <= ?", (time.time() - CACHE_TTL,))
+        db.execute("COMMIT")
+    except Exception as e:
+        logging.warning(f"Backtest cache write failed: {e}")
+        try:
+            db.execute("ROLLBACK")
+        except Exception:
+            pass
@@ -0,0 +1,98 @@
+import sys
+import time
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+# ------------------- Sample Tweets -------------------
+SUBJECTS = ["$TSLA", "#NIFTY", "RELIANCE", "BTC", "$AAPL", "SBIN", "#banknifty"]
+PHRASES = [
+    "breakout above resistance, loading more calls", "looks weak, expecting a dump below support",
+    "earnings beat, guidance raised", "massive selling volume today", "sideways chop, no trade",
+    "to the moon 🚀🚀", "bearish divergence on the daily RSI", "accumulating on every dip",
+    "crash incoming, hedge your longs", "analyst upgrade with a higher target",
+]
+
+
+def sample_texts(count, seed=0):
+    """
+    Synthetic tweets of mixed length; about a third repeat the same phrase
+    with different padding, like real search results.
+    """
+    rng = random.Random(seed)
+    texts = []
+    for i in range(count):
+        words = [rng.choice(SUBJECTS), rng.choice(PHRASES)]
+        words += [rng.choice(PHRASES) for _ in range(rng.choice([0, 0, 1, 2, 4]))]
+        texts.append(f"{' '.join(words)} #{i}")
+    return texts
+
+# ------------------- Scorers -------------------
+def vader_scorer():
+    from twitter import _score
+    return lambda texts: [_score(text) for text in texts]
+
+
+def transformer_scorer(quantize, max_batch, max_wait_ms):
+    from transformer_sentiment import TransformerScorer, DynamicBatcher
+    return DynamicBatcher(TransformerScorer(quantize=quantize), max_batch=max_batch, max_wait_ms=max_wait_ms).score
+
+# ------------------- Measurements -------------------
+def throughput(score, texts, batch):
+    """
+    Texts per second when scoring `texts` in calls of `batch` texts.
+    """
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch):
+        score(texts[i:i + batch])
+    return len(texts) / (time.perf_counter() - start)
+
+
+def latency(score, texts, clients):
+    """
+    Per-request latency (ms) of single-text requests from `clients`
+    concurrent threads: what an engine worker sees.
+    """
+    def one(text):
+        start = time.perf_counter()
+        score([text])
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        timings = sorted(pool.map(one, texts))
+    pick = lambda q: timings[min(len(timings) - 1, int(q * len(timings)))]
+    return {"p50": pick(0.50), "p95": pick(0.95), "max": timings[-1]}
+
+# ------------------- Entry Point -------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare VADER and transformer sentiment throughput and latency")
+    parser.add_argument("--texts", type=int, default=2000, help="Texts for the throughput run")
+    parser.add_argument("--batch", type=int, default=64, help="Texts per call in the throughput run")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent single-text clients for latency")
+    parser.add_argument("--requests", type=int, default=400, help="Requests for the latency run")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--skip-transformer", action="store_true")
+    args = parser.parse_args()
+
+    texts = sample_texts(args.texts)
+    scorers = [("vader", vader_scorer)]
+    if not args.skip_transformer:
+        scorers += [
+            ("transformer", lambda: transformer_scorer(False, args.max_batch, args.max_wait_ms)),
+            ("transformer-int8", lambda: transformer_scorer(True, args.max_batch, args.max_wait_ms)),
+        ]
+
+    print(f"{'scorer':<18} {'load s':>8} {'texts/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for name, build in scorers:
+        try:
+            start = time.perf_counter()
+            score = build()
+            score(texts[:8])  # warm-up
+            load = time.perf_counter() - start
+        except ImportError as e:
+            print(f"{name:<18} unavailable: {e}", file=sys.stderr)
+            continue
+        rate = throughput(score, texts, args.batch)
+        lat = latency(score, texts[:args.requests], args.clients)
+        print(f"{name:<18} {load:>8.2f} {rate:>10.0f} {lat['p50']:>8.2f} {lat['p95']:>8.2f} {lat['max']:>8.2f}")
@@ -0,0 +1,76 @@
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+
+ENGINE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ------------------- Import Profiling -------------------
+def import_costs(module):
+    """
+    Import `module` in a fresh interpreter with -X importtime.
+    Returns (total_microseconds, {direct_dependency: cumulative_microseconds}).
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ENGINE_DIR, capture_output=True, text=True
+    )
+
+    total = 0
+    costs = {}
+    children = {}
+    for line in proc.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)", line)
+        if not match:
+            continue
+        cumulative, depth, name = int(match.group(2)), len(match.group(3)) // 2, match.group(4)
+        # importtime prints children before their parent, two spaces per level
+        if depth == 1:
+            children[name.split(".")[0]] = children.get(name.split(".")[0], 0) + cumulative
+        elif depth == 0:
+            if name == module:
+                total = cumulative
+                costs = children
+            children = {}
+    return total, costs
+
+
+def cold_start(args, runs):
+    """
+    Wall-clock time of `python engine.py <args>` in fresh processes.
+    """
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "engine.py", *args],
+            cwd=ENGINE_DIR, capture_output=True
+        )
+        timings.append(time.perf_counter() - start)
+    return timings
+
+# ------------------- Entry Point -------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report engine cold-start and per-module import cost")
+    parser.add_argument("--module", default="engine", help="Module to profile imports for")
+    parser.add_argument("--runs", type=int, default=5, help="Cold-start runs of engine.py --help")
+    parser.add_argument("--top", type=int, default=15, help="Number of modules to list")
+    parser.add_argument("--deep", action="store_true",
+                        help="Also profile the lazily-loaded modules a real run imports")
+    args = parser.parse_args()
+
+    modules = [args.module]
+    if args.deep:
+        modules += ["pandas", "market", "indicators", "chart", "groq", "nltk.sentiment.vader"]
+
+    for module in modules:
+        total, costs = import_costs(module)
+        print(f"\nimport {module}: {total / 1000:.1f} ms")
+        for name, us in sorted(costs.items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+            print(f"  {name:<30} {us / 1000:>9.1f} ms")
+
+    timings = cold_start(["--help"], args.runs)
+    print(f"\nengine.py --help over {args.runs} runs: "
+          f"min {min(timings) * 1000:.0f} ms, avg {sum(timings) / len(timings) * 1000:.0f} ms")
@@ -1,29 +1,128 @@
-import yfinance as yf
-import matplotlib.pyplot as plt
 import os
 import io
+import json
 import base64
+import hashlib
+import tempfile
+import threading
+import multiprocessing
+import numpy as np
 import pandas as pd
-from datetime import time
+from concurrent.futures import ProcessPoolExecutor
+import ohlcv_store
+from storage import cache_path
 
-def generate_chart(symbol):
-    chart_dir = os.path.join(os.getcwd(), "chart")
-    os.makedirs(chart_dir, exist_ok=True)
+# ------------------- Chart Cache -------------------
+# Rendered PNGs are cached per symbol and interval under <cache>/charts and
+# reused while the last bar (its timestamp and the plotted closes) is
+# unchanged, so repeated engine calls skip matplotlib entirely.
+CHART_INTERVAL = "15m"
+CHART_SESSIONS = 5
+BACKGROUND = "#020617"
+FIGSIZE = (7, 4)
+DPI = 100
+OUTPUTS = ("base64", "path", "hash")
 
-    # Fetch data
+# Longer series are downsampled to about one point per horizontal pixel
+MAX_POINTS = int(FIGSIZE[0] * DPI)
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", os.cpu_count() or 1))
+
+_Figure = None
+
+def get_figure():
+    """
+    Import matplotlib's Figure class on the first render; matplotlib is the
+    slowest import in the engine. Figures are drawn with the Agg canvas and
+    never touch pyplot's global state, so threads can render concurrently.
+    """
+    global _Figure
+    if _Figure is None:
+        from matplotlib.figure import Figure
+        _Figure = Figure
+    return _Figure
+
+
+def _cache_files(symbol, interval):
+    name = "".join(c if c.isalnum() or c in ".-_^=" else "_" for c in symbol.upper())
+    base = cache_path("charts", interval, name)
+    return base + ".png", base + ".json"
+
+
+def _chart_key(x, y):
+    digest = hashlib.sha256(y.astype("float64").tobytes()).hexdigest()[:16]
+    return f"{pd.Timestamp(x[-1]).value}:{len(y)}:{digest}"
+
+
+def _read_cached(symbol, interval, key):
+    png_path, meta_path = _cache_files(symbol, interval)
     try:
-        data = yf.download(
-            symbol,
-            period="5d",
-            interval="15m",
-            progress=False,
-            auto_adjust=True
-        )
-    except Exception as e:
-        print(f"❌ Error fetching {symbol}: {e}")
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("key") != key or not os.path.exists(png_path):
+            return None
+        return png_path, meta["sha256"]
+    except (OSError, ValueError, KeyError):
         return None
 
-    if data.empty or "Close" not in data.columns:
+
+# Read once at import: os.umask can only be read by setting it, which is not thread-safe
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _write_atomic(path, data, mode="wb"):
+    # A unique temp file per write, so threads of one process never share it
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        # mkstemp creates 0600 files; keep the usual umask-based permissions
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        with os.fdopen(fd, mode) as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _store(symbol, interval, key, png):
+    png_path, meta_path = _cache_files(symbol, interval)
+    sha256 = hashlib.sha256(png).hexdigest()
+    _write_atomic(png_path, png)
+    _write_atomic(meta_path, json.dumps({"key": key, "sha256": sha256}), mode="w")
+    return png_path, sha256
+
+
+def _output(png_path, sha256, output, png=None):
+    if output == "path":
+        return png_path
+    if output == "hash":
+        return sha256
+    if png is None:
+        with open(png_path, "rb") as f:
+            png = f.read()
+    return f"data:image/png;base64,{base64.b64encode(png).decode('utf-8')}"
+
+# ------------------- Rendering -------------------
+def _last_sessions(data, sessions):
+    if data is None or data.empty:
+        return data
+    days = data.index.normalize().unique()[-sessions:]
+    return data[data.index.normalize().isin(days)]
+
+
+def _fetch_period(sessions):
+    # Calendar days that cover `sessions` trading days, weekends included
+    return f"{sessions * 7 // 5 + 3}d"
+
+
+def _chart_series(symbol, data):
+    """
+    (x, y) to plot from a bars DataFrame, or None when there is nothing.
+    """
+    if data is None or data.empty or "Close" not in data.columns:
         print(f"⚠️ No valid 'Close' data for {symbol}")
         return None
 
@@ -37,43 +136,187 @@ def generate_chart(symbol):
     # Timezone-naive for plotting
     if isinstance(x, pd.DatetimeIndex) and x.tz is not None:
         x = x.tz_convert(None)
+    return x, y
+
+
+def _render_and_store(symbol, interval, key, x, y, output):
+    png = render_png(symbol, x, y)
+
+    # Local copy for the chart folder, written from the same encoded bytes
+    chart_dir = os.path.join(os.getcwd(), "chart")
+    os.makedirs(chart_dir, exist_ok=True)
+    _write_atomic(os.path.join(chart_dir, f"{symbol}.png"), png)
+
+    png_path, sha256 = _store(symbol, interval, key, png)
+    return _output(png_path, sha256, output, png)
+
+
+def generate_chart(symbol, market_data=None, interval=CHART_INTERVAL, output="base64",
+                   sessions=CHART_SESSIONS):
+    """
+    Render the intraday price chart. Bars come from `market_data` (a
+    market.MarketData) when given, otherwise from the local OHLCV store.
+
+    `output` selects the return value: "base64" (data URI, default), "path"
+    (the cached PNG file) or "hash" (sha256 of the PNG).
+    """
+    if output not in OUTPUTS:
+        raise ValueError(f"output must be one of {OUTPUTS}")
+
+    data = market_data.chart_bars(sessions) if market_data is not None else None
+
+    # Fetch data
+    if data is None:
+        try:
+            data = ohlcv_store.get_bars(symbol, interval=interval, period=_fetch_period(sessions))
+            data = _last_sessions(data, sessions)
+        except Exception as e:
+            print(f"❌ Error fetching {symbol}: {e}")
+            return None
+
+    series = _chart_series(symbol, data)
+    if series is None:
+        return None
+    x, y = series
+
+    key = _chart_key(x, y)
+    cached = _read_cached(symbol, interval, key)
+    if cached is not None:
+        return _output(*cached, output)
+    return _render_and_store(symbol, interval, key, x, y, output)
+
+# ------------------- Batch Rendering -------------------
+# A long-lived pool of chart processes with matplotlib already imported.
+# Workers are started from a clean forkserver (spawn where unavailable)
+# because the engine process itself runs threads.
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _pool = ProcessPoolExecutor(max_workers=CHART_WORKERS, mp_context=context, initializer=get_figure)
+        return _pool
+
 
-    # --- Plot ---
-    plt.figure(figsize=(7, 4), facecolor="#020617")
-    ax = plt.gca()
-    ax.set_facecolor("#020617")
-    
-    # Line plot
-    plt.plot(x, y, color="#22c55e", linewidth=2, label="Close Price")
-    plt.fill_between(x, y, y.min(), color="#22c55e", alpha=0.15)
+def _render_job(job):
+    symbol, interval, key, stamps, y, output, cwd = job
+    os.chdir(cwd)
+    return _render_and_store(symbol, interval, key, pd.DatetimeIndex(stamps), y, output)
 
-    # Dynamic Market Open/Close Shading (for each day)
+
+def generate_charts(symbols, interval=CHART_INTERVAL, output="base64", sessions=CHART_SESSIONS,
+                    bars=None, workers=CHART_WORKERS):
+    """
+    Charts for many symbols. Bars come from `bars` ({symbol: DataFrame})
+    when given, otherwise from one bulk OHLCV store read. Cached charts are
+    returned directly; the rest are rendered in the warm process pool.
+    Returns {symbol: output or None}.
+    """
+    if output not in OUTPUTS:
+        raise ValueError(f"output must be one of {OUTPUTS}")
+
+    symbols = list(dict.fromkeys(symbols))
+    if bars is None:
+        try:
+            bars = ohlcv_store.get_bars_bulk(symbols, interval=interval, period=_fetch_period(sessions))
+        except Exception as e:
+            print(f"❌ Error fetching charts: {e}")
+            bars = {}
+
+    results, jobs = {}, []
+    for symbol in symbols:
+        series = _chart_series(symbol, _last_sessions(bars.get(symbol), sessions))
+        if series is None:
+            results[symbol] = None
+            continue
+        x, y = series
+        key = _chart_key(x, y)
+        cached = _read_cached(symbol, interval, key)
+        if cached is not None:
+            results[symbol] = _output(*cached, output)
+        else:
+            jobs.append((symbol, interval, key, x.asi8, y, output, os.getcwd()))
+
+    if workers <= 1 or len(jobs) <= 1:
+        rendered = map(_render_job, jobs)
+    else:
+        rendered = _get_pool().map(_render_job, jobs)
+    for job, value in zip(jobs, rendered):
+        results[job[0]] = value
+    return results
+
+# ------------------- Downsampling -------------------
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets: indices of `threshold` points that keep
+    the visual shape of (x, y). Always keeps the first and last point.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    # Average of every bucket, used as the third triangle point
+    sums_x = np.concatenate([[0.0], np.cumsum(x)])
+    sums_y = np.concatenate([[0.0], np.cumsum(y)])
+    ends = np.append(edges[1:], n)
+    avg_x = (sums_x[ends] - sums_x[edges]) / (ends - edges)
+    avg_y = (sums_y[ends] - sums_y[edges]) / (ends - edges)
+
+    picked = np.empty(threshold, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Next bucket's average (the last point for the final bucket)
+        nx, ny = (avg_x[i + 1], avg_y[i + 1]) if i + 2 < threshold - 1 else (x[-1], y[-1])
+        area = np.abs((x[a] - nx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (ny - y[a]))
+        a = lo + int(np.argmax(area))
+        picked[i + 1] = a
+    return picked
+
+
+def render_png(symbol, x, y):
+    """
+    Draw the chart on a standalone Agg figure and return the PNG bytes.
+    """
+    fig = get_figure()(figsize=FIGSIZE, dpi=DPI, facecolor=BACKGROUND)
+    ax = fig.add_subplot()
+    ax.set_facecolor(BACKGROUND)
+
+    # Line plot, at most about one point per pixel
+    keep = lttb(x.asi8, y, MAX_POINTS)
+    ax.plot(x[keep], y[keep], color="#22c55e", linewidth=2, label="Close Price")
+    ax.fill_between(x[keep], y[keep], y.min(), color="#22c55e", alpha=0.15)
+
+    # Dynamic Market Open/Close Shading (for each day), drawn as one collection
+    from matplotlib.dates import date2num
     unique_dates = pd.to_datetime(x.date).unique()
-    for d in unique_dates:
-        day_start = pd.Timestamp.combine(d, time(9, 15))
-        day_end = pd.Timestamp.combine(d, time(15, 30))
-        plt.axvspan(day_start, day_end, color="#ffffff", alpha=0.02)
+    opens = date2num(unique_dates + pd.Timedelta(hours=9, minutes=15))
+    closes = date2num(unique_dates + pd.Timedelta(hours=15, minutes=30))
+    ax.broken_barh(list(zip(opens, closes - opens)), (0, 1), transform=ax.get_xaxis_transform(),
+                   color="#ffffff", alpha=0.02)
 
     # Labels & style
-    plt.title(symbol, color="white", fontsize=14, pad=10)
-    plt.xlabel("Time", color="#94a3b8")
-    plt.ylabel("Price", color="#94a3b8")
-    plt.xticks(color="#94a3b8", rotation=45)
-    plt.yticks(color="#94a3b8")
+    ax.set_title(symbol, color="white", fontsize=14, pad=10)
+    ax.set_xlabel("Time", color="#94a3b8")
+    ax.set_ylabel("Price", color="#94a3b8")
+    ax.tick_params(axis="x", labelcolor="#94a3b8", labelrotation=45)
+    ax.tick_params(axis="y", labelcolor="#94a3b8")
     for spine in ax.spines.values():
         spine.set_visible(False)
-    plt.grid(alpha=0.1)
-    plt.tight_layout()
-
-    # Save locally
-    chart_path = os.path.join(chart_dir, f"{symbol}.png")
-    plt.savefig(chart_path, bbox_inches="tight", facecolor="#020617")
+    ax.grid(alpha=0.1)
+    fig.tight_layout()
 
-    # Convert to base64
+    # Encode once; the file copy and the base64 string share these bytes
     buf = io.BytesIO()
-    plt.savefig(buf, format="png", bbox_inches="tight", facecolor="#020617")
-    plt.close()
-    buf.seek(0)
-    img_base64 = base64.b64encode(buf.read()).decode("utf-8")
-
-    return f"data:image/png;base64,{img_base64}"
+    fig.savefig(buf, format="png", bbox_inches="tight", facecolor=BACKGROUND)
+    return buf.getvalue()
@@ -0,0 +1,261 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ------------------- Fake Groq Server -------------------
+# A local stand-in for the chat completions endpoint. Each request takes the
+# next scripted reply (status, headers, delay); once the script runs out it
+# answers 200 with the configured content. The server counts every request
+# it sees, which is what the checks below assert on.
+class FakeGroq(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeHandler)
+        self.lock = threading.Lock()
+        self.reset()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def reset(self, script=(), content="ok", delay=0.0):
+        with self.lock:
+            self.script = list(script)
+            self.content = content
+            self.delay = delay
+            self.hits = 0
+
+    def next_reply(self):
+        with self.lock:
+            self.hits += 1
+            if self.script:
+                return self.script.pop(0)
+            return 200, {}, self.delay
+
+    def handle_error(self, request, client_address):
+        pass  # clients that hit their deadline hang up mid-reply
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        status, headers, delay = self.server.next_reply()
+        time.sleep(delay)
+        if status == 200:
+            chars = sum(len(m.get("content", "")) for m in request.get("messages", []))
+            tokens = chars // 4 + request.get("max_tokens", 0)
+            body = {
+                "id": "fake", "object": "chat.completion", "created": 0, "model": request.get("model"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": self.server.content}}],
+                "usage": {"prompt_tokens": chars // 4, "completion_tokens": tokens - chars // 4,
+                          "total_tokens": tokens}
+            }
+        else:
+            body = {"error": {"message": f"fake {status}", "type": "fake", "code": str(status)}}
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        for name, value in {"Content-Type": "application/json", **headers}.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+# ------------------- Dispatcher Checks -------------------
+MODEL = "fake-model"
+
+
+def _messages(text="hello"):
+    return [{"role": "user", "content": text}]
+
+
+def _dispatcher(server, **options):
+    from groq_dispatch import Dispatcher
+    options.setdefault("deadline", 10)
+    return Dispatcher(api_key="fake", base_url=server.url, **options).start()
+
+
+def _timed(fn):
+    start = time.monotonic()
+    try:
+        return fn(), None, time.monotonic() - start
+    except Exception as e:
+        return None, e, time.monotonic() - start
+
+
+def check_rpm_pacing(server):
+    # 600 RPM refills one request per 0.1 s once the burst is spent
+    dispatcher = _dispatcher(server, rpm=600)
+    dispatcher.requests.take(dispatcher.requests.capacity)
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        _, _, elapsed = _timed(lambda: list(pool.map(
+            lambda i: dispatcher.complete(_messages(), MODEL, 10), range(5))))
+    assert server.hits == 5, f"{server.hits} requests reached the server"
+    assert elapsed >= 0.45, f"5 requests on an empty 600 RPM bucket took {elapsed:.2f}s"
+    assert dispatcher.stats["throttled_seconds"] > 0
+
+
+def check_tpm_pacing(server):
+    # 20 characters + 15 max_tokens reserve 20 tokens; 6000 TPM refills 100/s
+    dispatcher = _dispatcher(server, tpm=6000)
+    dispatcher.tokens.take(dispatcher.tokens.capacity)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        _, _, elapsed = _timed(lambda: list(pool.map(
+            lambda i: dispatcher.complete(_messages("x" * 20), MODEL, 15), range(4))))
+    assert elapsed >= 0.75, f"4 x 20 tokens on an empty 6000 TPM bucket took {elapsed:.2f}s"
+    assert dispatcher.stats["tokens"] == 80, dispatcher.stats
+
+
+def check_retry_after(server):
+    busy = (429, {"Retry-After": "0.3"}, 0.0)
+    server.reset([busy, busy], content="recovered")
+    dispatcher = _dispatcher(server)
+    result, error, elapsed = _timed(lambda: dispatcher.complete(_messages(), MODEL, 10))
+    assert error is None and result == "recovered", error
+    assert server.hits == 3 and dispatcher.stats["retries"] == 2, dispatcher.stats
+    assert elapsed >= 0.6, f"two Retry-After: 0.3 waits took {elapsed:.2f}s"
+
+
+def check_server_error_retry(server):
+    server.reset([(503, {}, 0.0)])
+    dispatcher = _dispatcher(server)
+    result, error, _ = _timed(lambda: dispatcher.complete(_messages(), MODEL, 10))
+    assert error is None and result == "ok", error
+    assert server.hits == 2 and dispatcher.stats["retries"] == 1, dispatcher.stats
+
+
+def check_client_error(server):
+    import groq
+    server.reset([(400, {}, 0.0)])
+    dispatcher = _dispatcher(server)
+    _, error, _ = _timed(lambda: dispatcher.complete(_messages(), MODEL, 10))
+    assert isinstance(error, groq.BadRequestError), repr(error)
+    assert server.hits == 1 and dispatcher.stats["failures"] == 1, dispatcher.stats
+
+
+def check_deadline(server):
+    server.reset(delay=3.0)
+    dispatcher = _dispatcher(server)
+    _, error, elapsed = _timed(lambda: dispatcher.complete(_messages(), MODEL, 10, deadline=0.5))
+    assert isinstance(error, asyncio.TimeoutError), repr(error)
+    assert elapsed < 1.5, f"a 0.5s deadline returned after {elapsed:.2f}s"
+
+
+def check_retry_after_past_deadline(server):
+    import groq
+    server.reset([(429, {"Retry-After": "30"}, 0.0)])
+    dispatcher = _dispatcher(server)
+    _, error, elapsed = _timed(lambda: dispatcher.complete(_messages(), MODEL, 10, deadline=2))
+    assert isinstance(error, groq.RateLimitError), repr(error)
+    assert server.hits == 1 and elapsed < 1.0, f"{server.hits} requests, {elapsed:.2f}s"
+
+
+def check_caller_errors(server):
+    # engine.call_groq_ai turns failures into {"error": ...}, which is never cached
+    import engine
+    prompt = f"caller errors {time.time()}"
+    server.reset([(400, {}, 0.0)], content='{"signal": "hold"}')
+    first = engine.call_groq_ai(prompt, model=MODEL, max_tokens=10)
+    assert "error" in first, first
+    second = engine.call_groq_ai(prompt, model=MODEL, max_tokens=10)
+    third = engine.call_groq_ai(prompt, model=MODEL, max_tokens=10)
+    assert second == third == {"signal": "hold"}, (second, third)
+    assert server.hits == 2, f"{server.hits} requests reached the server"
+
+# ------------------- Cache Checks -------------------
+def _cached(dispatcher, text):
+    import llm_cache
+    messages = _messages(text)
+    return llm_cache.cached_call(MODEL, {"max_tokens": 10}, messages,
+                                 lambda: {"content": dispatcher.complete(messages, MODEL, 10)})
+
+
+def check_thread_single_flight(server):
+    import llm_cache
+    server.reset(delay=0.5)
+    dispatcher = _dispatcher(server)
+    text = f"threads {time.time()}"
+    before = dict(llm_cache._stats)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda i: _cached(dispatcher, text), range(8)))
+    assert all(r == {"content": "ok"} for r in results), results
+    assert server.hits == 1, f"{server.hits} upstream calls for 8 identical requests"
+    assert llm_cache._stats["coalesced"] - before["coalesced"] == 7, llm_cache._stats
+
+
+def _process_caller(url, text, start, results):
+    from groq_dispatch import Dispatcher
+    dispatcher = Dispatcher(api_key="fake", base_url=url, deadline=10).start()
+    start.wait()
+    results.put(_cached(dispatcher, text))
+
+
+def check_process_single_flight(server, processes=4):
+    # Spawned interpreters share the cache directory through the environment
+    server.reset(delay=1.0)
+    text = f"processes {time.time()}"
+    context = multiprocessing.get_context("spawn")
+    start, results = context.Event(), context.Queue()
+    workers = [context.Process(target=_process_caller, args=(server.url, text, start, results))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    time.sleep(2.0)  # let every child import and park on the event
+    start.set()
+    answers = [results.get(timeout=30) for _ in workers]
+    for worker in workers:
+        worker.join(timeout=10)
+    assert all(a == {"content": "ok"} for a in answers), answers
+    assert server.hits == 1, f"{server.hits} upstream calls for {processes} identical requests"
+
+# ------------------- Entry Point -------------------
+CHECKS = [
+    check_rpm_pacing, check_tpm_pacing, check_retry_after, check_server_error_retry,
+    check_client_error, check_deadline, check_retry_after_past_deadline, check_caller_errors,
+    check_thread_single_flight, check_process_single_flight,
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check Groq pacing, retries, deadlines and LLM cache single-flight against a local fake server")
+    parser.add_argument("checks", nargs="*", help="Run only these checks (name without the check_ prefix)")
+    args = parser.parse_args()
+
+    # Point everything at the fake server and a throwaway cache before the
+    # engine modules are imported
+    server = FakeGroq()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["GROQ_BASE_URL"] = server.url
+    os.environ["GROQ_API_KEY"] = "fake"
+    os.environ["ENGINE_CACHE_DIR"] = tempfile.mkdtemp(prefix="check_llm_")
+
+    failed = 0
+    for check in CHECKS:
+        name = check.__name__[len("check_"):]
+        if args.checks and name not in args.checks:
+            continue
+        server.reset()
+        _, error, elapsed = _timed(lambda: check(server))
+        status = "ok" if error is None else f"FAIL {type(error).__name__}: {error}"
+        failed += error is not None
+        print(f"{name:<28} {elapsed:>6.2f}s  {status}")
+    server.shutdown()
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,11 @@ import argparse
 import re
 import os
 import logging
+import threading
 import requests
-from market import get_price
+from concurrent.futures import ThreadPoolExecutor
 from sentiment import sentiment_for_symbol
-from chart import generate_chart
-import pandas as pd
-import yfinance as yf
-from indicators import calculate_indicators_from_price, sanitize_indicators
+import symbol_cache
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 logging.getLogger("matplotlib").setLevel(logging.ERROR)
 logging.getLogger("PIL").setLevel(logging.ERROR)
@@ -28,12 +26,13 @@ logging.basicConfig(
 )
 
 # ------------------- Groq AI -------------------
-from groq import Groq
-
-api_key = os.environ.get("GROQ_API_KEY")
-if not api_key:
-    logging.warning("GROQ_API_KEY not found in environment variables.")
-groq_client = Groq(api_key=api_key)
+def get_groq_client():
+    """
+    The process-wide Groq dispatcher (see groq_dispatch), started on first
+    use so importing the engine stays cheap.
+    """
+    from groq_dispatch import get_dispatcher
+    return get_dispatcher()
 
 # ------------------- Prompt Builders -------------------
 def build_groq_prompt(symbol, price_data, sentiment_score):
@@ -62,19 +61,37 @@ Return a JSON object ONLY with the following keys (no extra text):
 Do not include any explanations or extra text. Output must be valid JSON.
 """
 
-def call_groq_ai(prompt: str, model="openai/gpt-oss-20b", max_tokens=612):
+SYSTEM_PROMPT = "You are a professional market analyst."
+GROQ_TEMPERATURE = 0.3
+
+def call_groq_ai(prompt: str, model="openai/gpt-oss-20b", max_tokens=612, use_cache=True):
+    """
+    Chat completion parsed to JSON. Identical requests are answered from the
+    shared LLM response cache (see llm_cache) unless `use_cache` is False.
+    """
+    if not use_cache:
+        return _call_groq_ai(prompt, model, max_tokens)
+
+    import llm_cache
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+    params = {"max_tokens": max_tokens, "temperature": GROQ_TEMPERATURE}
+    return llm_cache.cached_call(model, params, messages, lambda: _call_groq_ai(prompt, model, max_tokens))
+
+
+def _call_groq_ai(prompt, model, max_tokens):
     try:
-        response = groq_client.chat.completions.create(
+        raw_text = get_groq_client().complete(
             messages=[
-                {"role": "system", "content": "You are a professional market analyst."},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
             model=model,
             max_tokens=max_tokens,
-            temperature=0.3
+            temperature=GROQ_TEMPERATURE
         )
-
-        raw_text = response.choices[0].message.content
         match = re.search(r"\{.*\}", raw_text, re.DOTALL)
         if match:
             try:
@@ -155,14 +172,18 @@ def extract_candidate_symbol(text):
     candidate = max(filtered, key=len)
     return candidate.upper()
 
-def search_yahoo_symbol(name):
+def search_yahoo_symbol(name, raise_errors=False):
+    """
+    Best Yahoo ticker for `name`, or None when the search finds nothing.
+    Request errors also return None unless `raise_errors` is set.
+    """
     try:
         url = f"https://query2.finance.yahoo.com/v1/finance/search?q={name}"
         headers = {"User-Agent": "Mozilla/5.0"}
         r = requests.get(url, headers=headers, timeout=5)
 
         if r.status_code != 200:
-            return None
+            raise requests.HTTPError(f"Yahoo search returned status {r.status_code}")
 
         data = r.json()
         quotes = data.get("quotes", [])
@@ -191,16 +212,45 @@ def search_yahoo_symbol(name):
 
     except Exception as e:
         logging.error(f"Yahoo search error: {e}")
+        if raise_errors:
+            raise
         return None
 
 
-def build_groq_combined_prompt(symbol, price_data, sentiment_score, indicators):
-    return f"""
-You are a professional financial and technical market analyst.
+ANALYSIS_SCHEMA = """{
+  "predicted_move": "up | down | neutral",
+  "technical_analysis": {
+    "ema_alignment": "bullish | bearish | neutral",
+    "rsi_state": "overbought | oversold | neutral",
+    "macd_state": "bullish | bearish | neutral",
+    "technical_bias": "bullish | bearish | neutral",
+    "reason": "short explanation"
+  },
+  "confidence_hint": {
+    "technical": 0-100,
+    "sentiment": 0-100
+  },
+  "levels": {
+    "support": float,
+    "resistance": float
+  },
+  "trade_plan": {
+    "entry": float,
+    "stop_loss": float,
+    "targets": [float, float, float]
+  },
+  "risk": "low | moderate | high",
+  "recommendation": "buy | sell | hold"
+}"""
 
-Analyze the following asset using BOTH market data and technical indicators.
+ANALYSIS_RULES = """IMPORTANT RULES:
+- Do NOT calculate final confidence
+- confidence_hint is only an estimation
+- No explanations outside JSON"""
 
-Symbol: "{symbol}"
+
+def _asset_prompt(symbol, price_data, sentiment_score, indicators):
+    return f"""Symbol: "{symbol}"
 
 Market Data:
 - Current Price: {price_data.get('price', 0.0)}
@@ -217,218 +267,450 @@ Technical Indicators:
 - RSI: {indicators['rsi']}
 - MACD Value: {indicators['macd']['value']}
 - MACD Signal: {indicators['macd']['signal']}
-- MACD Histogram: {indicators['macd']['histogram']}
+- MACD Histogram: {indicators['macd']['histogram']}"""
+
+
+def build_groq_combined_prompt(symbol, price_data, sentiment_score, indicators):
+    return f"""
+You are a professional financial and technical market analyst.
+
+Analyze the following asset using BOTH market data and technical indicators.
+
+{_asset_prompt(symbol, price_data, sentiment_score, indicators)}
 
 Return ONLY valid JSON with NO extra text:
 
-{{
-  "predicted_move": "up | down | neutral",
-  "technical_analysis": {{
-    "ema_alignment": "bullish | bearish | neutral",
-    "rsi_state": "overbought | oversold | neutral",
-    "macd_state": "bullish | bearish | neutral",
-    "technical_bias": "bullish | bearish | neutral",
-    "reason": "short explanation"
-  }},
-  "confidence_hint": {{
-    "technical": 0-100,
-    "sentiment": 0-100
-  }},
-  "levels": {{
-    "support": float,
-    "resistance": float
-  }},
-  "trade_plan": {{
-    "entry": float,
-    "stop_loss": float,
-    "targets": [float, float, float]
-  }},
-  "risk": "low | moderate | high",
-  "recommendation": "buy | sell | hold"
-}}
+{ANALYSIS_SCHEMA}
 
-IMPORTANT RULES:
-- Do NOT calculate final confidence
-- confidence_hint is only an estimation
-- No explanations outside JSON
+{ANALYSIS_RULES}
 """
 
 
-# ------------------- Core Engine -------------------
-def run_engine(symbol, entry_price=None):
-    try:
-        def safe_float(x):
-            try:
-                return float(x)
-            except:
-                return None
+def build_groq_batch_prompt(assets):
+    """
+    One prompt for several assets. `assets` is a list of
+    (symbol, price_data, sentiment_score, indicators); the answer is a JSON
+    object keyed by symbol, each value in the single-asset schema.
+    """
+    sections = "\n\n".join(
+        f"### Asset {n}\n{_asset_prompt(*asset)}" for n, asset in enumerate(assets, 1)
+    )
+    keys = ", ".join(f'"{asset[0]}"' for asset in assets)
+    return f"""
+You are a professional financial and technical market analyst.
 
-        def safe_int(x):
-            try:
-                return int(x)
-            except:
-                return None
+Analyze each of the following {len(assets)} assets independently using BOTH market data and technical indicators.
 
-        candidate = extract_candidate_symbol(symbol)
-        if not candidate:
-            return {"symbol": symbol, "error": "Could not extract candidate symbol", "alerts": ["error"]}
+{sections}
 
-        yahoo_symbol = search_yahoo_symbol(candidate)
-        logging.info(f"Yahoo resolved symbol: {yahoo_symbol} for candidate: {candidate}")
+Return ONLY valid JSON with NO extra text: one object whose keys are exactly the symbols
+{keys}, each mapped to an analysis in this format:
 
-        if yahoo_symbol:
-            symbols = normalize_symbol(yahoo_symbol)
-            logging.info(f"Normalized symbols from Yahoo: {symbols}")
-        else:
-            logging.warning(f"Yahoo could not resolve symbol: {candidate}. Trying raw normalization.")
-            symbols = normalize_symbol(candidate)
+{ANALYSIS_SCHEMA}
 
-        price_data = None
-        resolved_symbol = None
-        indicators = None
-        temp_df = None
-        for sym in symbols:
-            price_data = get_price(sym)  # your existing function, returns dict
-            if price_data:  # only calculate indicators if price_data exists
-                resolved_symbol = sym               
-                temp_df = pd.DataFrame({
-                    "Close": price_data.get("history", [price_data.get("price")])
-                })
-                indicators = calculate_indicators_from_price(temp_df)
-                indicators = sanitize_indicators(indicators)
-                # Ensure numeric defaults if any indicator is None
-                if not indicators:
-                    indicators = {
-                        "ema20": 0.0,
-                        "ema50": 0.0,
-                        "rsi": 50.0,
-                        "macd": {"value": 0.0, "signal": 0.0, "histogram": 0.0}
-                    }
-                break  # stop after first valid price_data
+{ANALYSIS_RULES}
+- Every symbol must have its own complete analysis
+"""
 
-        if not price_data:
-            logging.warning("No price data found.")
-            return {
-                "symbol": symbols,
-                "error": "No price data found",
-                "alerts": ["error"]
-            }
-        technical_signals = {
-            "ema_alignment": "bullish" if indicators["ema20"] > indicators["ema50"] else "bearish",
-            "rsi": "overbought" if indicators["rsi"] > 70 else "oversold" if indicators["rsi"] < 30 else "neutral",
-            "macd": "bullish" if indicators["macd"]["value"] > indicators["macd"]["signal"] else "bearish" if indicators["macd"]["value"] < indicators["macd"]["signal"] else "neutral"
-        }
-        price = safe_float(price_data.get("price"))
-        low = safe_float(price_data.get("low"))
-        high = safe_float(price_data.get("high"))
-        volume = safe_int(price_data.get("volume"))
-        avg_volume = safe_int(price_data.get("avg_volume"))
-        change_percent = safe_float(price_data.get("change_percent"))
-
-        alerts = []
-        # ----------------- Technical Indicators -----------------
-        #indicators = get_technical_indicators(resolved_symbol)
-
-        technical_analysis = {}
-        technical_score = 0
-        
-        # ----------------- Sentiment -----------------
-        try:
-            result = sentiment_for_symbol(resolved_symbol)
-        except Exception as e:
-            logging.warning(f"Sentiment analysis failed: {e}")
-            result = {
-                "symbol": resolved_symbol,
-                "sentiment_score": 0,
-                "sentiment_label": "Neutral",
-                "confidence": 0.0,
-                "emoji": "⚪",
-                "explanation": "Sentiment service unavailable"
-            }
 
-        s_type = result.get("sentiment_label", "Neutral")
-        if s_type == "Bullish" or s_type == "accumulation":
-            alerts.append("buy_signal")
-        elif s_type == "Hype":
-            alerts.append("trap_warning")
-        elif s_type == "Bearish" or s_type == "distribution":
-            alerts.append("sell_signal")
-
-        suggested_entry = None
-        if low is not None and high is not None:
-            suggested_entry = {
-                "lower": round(low * 0.99, 2),
-                "upper": round(low * 1.02, 2)
-            }
+ANALYSIS_CHOICES = {
+    "predicted_move": {"up", "down", "neutral"},
+    "risk": {"low", "moderate", "high"},
+    "recommendation": {"buy", "sell", "hold"},
+}
 
-        chart_base64 = generate_chart(resolved_symbol)
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
 
-        try:
-            prompt = build_groq_combined_prompt(
-                resolved_symbol, price_data, result.get("sentiment_score", 0, ), indicators
-            )
-            ai_analysis = call_groq_ai(prompt)
-            if not isinstance(ai_analysis, dict):
-                ai_analysis = {"error": "Invalid AI response"}            
-        except Exception as e_ai:
-            logging.warning(f"Groq AI analysis failed: {e_ai}")
-            ai_analysis = {"error": "Groq AI call failed"}
-
-        # Confidence Breakdown
-        confidence_breakdown = {
-            "technical": technical_score,
-            "sentiment": int(result.get("confidence", 0) * 100),
-            "volume": 60 if volume and avg_volume and volume > avg_volume else 45,
-            "price_action": 60,  # Can improve later
-            "trend": 65 if technical_score > 60 else 50,
-            "signals": technical_signals  # Added technical signals
-        }
 
-        # Total Confidence
-        confidence_breakdown["total"] = round(
-            confidence_breakdown["technical"] * 0.30 +
-            confidence_breakdown["volume"] * 0.20 +
-            confidence_breakdown["sentiment"] * 0.15 +
-            confidence_breakdown["price_action"] * 0.20 +
-            confidence_breakdown["trend"] * 0.15
+def validate_analysis(analysis):
+    """
+    True when an AI analysis has every field of ANALYSIS_SCHEMA with a usable
+    value.
+    """
+    try:
+        for key, choices in ANALYSIS_CHOICES.items():
+            if str(analysis[key]).lower() not in choices:
+                return False
+        if not isinstance(analysis["technical_analysis"], dict):
+            return False
+        hint = analysis["confidence_hint"]
+        levels = analysis["levels"]
+        plan = analysis["trade_plan"]
+        return (
+            all(_is_number(hint[k]) for k in ("technical", "sentiment"))
+            and all(_is_number(levels[k]) for k in ("support", "resistance"))
+            and all(_is_number(plan[k]) for k in ("entry", "stop_loss"))
+            and isinstance(plan["targets"], list) and all(_is_number(t) for t in plan["targets"])
         )
+    except (KeyError, TypeError):
+        return False
 
-        overall_confidence = round(
-            confidence_breakdown["technical"] * 0.30 +
-            confidence_breakdown["volume"] * 0.20 +
-            confidence_breakdown["sentiment"] * 0.15 +
-            confidence_breakdown["price_action"] * 0.20 +
-            confidence_breakdown["trend"] * 0.15
-        )
 
+GROQ_BATCH_SIZE = int(os.getenv("GROQ_BATCH_SIZE", 8))
+GROQ_TOKENS_PER_ASSET = 612
+
+def analyze_single(symbol, price_data, sentiment_score, indicators):
+    try:
+        ai_analysis = call_groq_ai(build_groq_combined_prompt(symbol, price_data, sentiment_score, indicators))
+        if not isinstance(ai_analysis, dict):
+            ai_analysis = {"error": "Invalid AI response"}
+    except Exception as e_ai:
+        logging.warning(f"Groq AI analysis failed: {e_ai}")
+        ai_analysis = {"error": "Groq AI call failed"}
+    return ai_analysis
+
+
+def analyze_batch(assets, batch_size=GROQ_BATCH_SIZE, workers=4):
+    """
+    AI analysis for many assets with one Groq request per `batch_size`
+    assets. Each symbol's section of the answer is validated on its own;
+    symbols that are missing or malformed fall back to an individual
+    request. Returns {symbol: analysis}.
+    """
+    assets = list({asset[0]: asset for asset in assets}.values())
+    chunks = [assets[i:i + batch_size] for i in range(0, len(assets), batch_size)]
+
+    def run_chunk(chunk):
+        if len(chunk) == 1:
+            return {chunk[0][0]: analyze_single(*chunk[0])}
+        try:
+            answer = call_groq_ai(build_groq_batch_prompt(chunk), max_tokens=GROQ_TOKENS_PER_ASSET * len(chunk))
+        except Exception as e:
+            logging.warning(f"Groq batch analysis failed: {e}")
+            answer = {}
+        if not isinstance(answer, dict) or "error" in answer:
+            answer = {}
+        # Models occasionally change the case of a key
+        answer = {str(k).upper(): v for k, v in answer.items()}
+
+        found, retry = {}, []
+        for asset in chunk:
+            section = answer.get(asset[0].upper())
+            if validate_analysis(section):
+                found[asset[0]] = section
+            else:
+                retry.append(asset)
+        if retry:
+            logging.warning(f"Groq batch answer incomplete for {[a[0] for a in retry]}, retrying individually.")
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for asset, ai_analysis in zip(retry, pool.map(lambda a: analyze_single(*a), retry)):
+                    found[asset[0]] = ai_analysis
+        return found
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for found in pool.map(run_chunk, chunks):
+            results.update(found)
+    return results
+
+# ------------------- Analysis Modes -------------------
+# local   deterministic analysis from bars and indicators (local_analysis)
+# llm     Groq analysis
+# hybrid  local analysis, with Groq asked only when the local signals
+#         conflict; a failed Groq answer falls back to the local one
+ANALYSIS_MODES = ("local", "llm", "hybrid")
+ANALYSIS_MODE = os.getenv("ENGINE_ANALYSIS", "llm")
+
+
+def check_analysis_mode(mode):
+    if mode not in ANALYSIS_MODES:
+        raise ValueError(f"analysis must be one of {ANALYSIS_MODES}")
+    return mode
+
+
+def analyze_assets(assets, mode=ANALYSIS_MODE, daily=None, workers=4):
+    """
+    AI analysis for (symbol, price_data, sentiment_score, indicators) assets
+    in the given mode. `daily` maps symbols to daily bars for the local
+    analysis. Returns {symbol: (analysis, source)} with source "local" or "llm".
+    """
+    import local_analysis
+
+    check_analysis_mode(mode)
+    daily = daily or {}
+    local = {}
+    if mode != "llm":
+        for asset in assets:
+            local[asset[0]] = local_analysis.analyze(*asset, daily=daily.get(asset[0]))
+
+    if mode == "local":
+        wanted = []
+    elif mode == "hybrid":
+        wanted = [asset for asset in assets if local_analysis.signals_conflict(asset[3])]
+    else:
+        wanted = list(assets)
+
+    results = {symbol: (analysis, "local") for symbol, analysis in local.items()}
+    if len(wanted) > 1:
+        answers = analyze_batch(wanted, workers=workers)
+    else:
+        answers = {asset[0]: analyze_single(*asset) for asset in wanted}
+    for symbol, answer in answers.items():
+        if symbol in local and (not isinstance(answer, dict) or "error" in answer):
+            continue
+        results[symbol] = (answer, "llm")
+    return results
 
+
+
+# ------------------- Core Engine -------------------
+def safe_float(x):
+    try:
+        return float(x)
+    except:
+        return None
+
+def safe_int(x):
+    try:
+        return int(x)
+    except:
+        return None
+
+DEFAULT_INDICATORS = {
+    "ema20": 0.0,
+    "ema50": 0.0,
+    "rsi": 50.0,
+    "macd": {"value": 0.0, "signal": 0.0, "histogram": 0.0}
+}
+
+def resolve_candidates(symbol, use_cache=True):
+    """
+    Turn raw user text into the ordered list of ticker candidates to try.
+    Returns None when no candidate symbol can be extracted.
+    Known text resolves straight from the symbol cache (unless use_cache is
+    False); otherwise the Yahoo search result is cached (negatively too) and
+    variants are ranked by which suffixes have resolved before.
+    """
+    cached = symbol_cache.get_resolved(symbol) if use_cache else None
+    if cached:
+        logging.info(f"Symbol cache hit: {symbol} -> {cached}")
+        return [cached]
+
+    candidate = extract_candidate_symbol(symbol)
+    if not candidate:
+        return None
+
+    yahoo_symbol = symbol_cache.get_search(candidate)
+    if yahoo_symbol is symbol_cache.MISSING:
+        try:
+            yahoo_symbol = search_yahoo_symbol(candidate, raise_errors=True)
+            symbol_cache.set_search(candidate, yahoo_symbol)
+        except Exception:
+            yahoo_symbol = None  # a failed search is not cached as "not found"
+    logging.info(f"Yahoo resolved symbol: {yahoo_symbol} for candidate: {candidate}")
+
+    if yahoo_symbol:
+        symbols = normalize_symbol(yahoo_symbol)
+        logging.info(f"Normalized symbols from Yahoo: {symbols}")
+    else:
+        logging.warning(f"Yahoo could not resolve symbol: {candidate}. Trying raw normalization.")
+        symbols = normalize_symbol(candidate)
+    return symbol_cache.rank_candidates(symbols)
+
+
+def record_resolution(symbol, tried, resolved_symbol, transient=()):
+    """
+    Feed probe outcomes back into the symbol cache. Failed probes listed in
+    `transient` may have been outages and are only skipped briefly.
+    """
+    for sym in tried:
+        symbol_cache.record_probe(sym, sym == resolved_symbol, transient=sym in transient)
+    if resolved_symbol:
+        symbol_cache.set_resolved(symbol, resolved_symbol)
+    else:
+        symbol_cache.forget_resolved(symbol)
+
+
+def get_sentiment(resolved_symbol):
+    try:
+        return sentiment_for_symbol(resolved_symbol)
+    except Exception as e:
+        logging.warning(f"Sentiment analysis failed: {e}")
         return {
             "symbol": resolved_symbol,
-            "price": price,
-            "low": low,
-            "high": high,
-            "volume": volume,
-            "avg_volume": avg_volume,
-            "change_percent": change_percent,
-
-            "sentiment_score": safe_float(result.get("sentiment_score", 0)),
-            "sentiment_label": result.get("sentiment_label", "Neutral"),
-
-            "confidence": overall_confidence,
-            "confidence_breakdown": confidence_breakdown,
-
-            "technical_indicators": indicators,
-            "technical_analysis": technical_analysis,
-
-            "emoji": result.get("emoji", "⚪"),
-            "explanation": technical_analysis.get("reason", ""),
-            "alerts": alerts,
-            "suggested_entry": suggested_entry,
-            "chart": chart_base64,
-            "ai_analysis": ai_analysis
+            "sentiment_score": 0,
+            "sentiment_label": "Neutral",
+            "confidence": 0.0,
+            "emoji": "⚪",
+            "explanation": "Sentiment service unavailable"
         }
 
 
+def build_engine_result(resolved_symbol, price_data, indicators, market_data=None, sentiment=None,
+                        ai_analysis=None, analysis=ANALYSIS_MODE):
+    """
+    Sentiment, chart, AI analysis and confidence scoring for a symbol whose
+    quote and indicators are already known. The chart and the local analysis
+    reuse `market_data` bars when given; `sentiment` and `ai_analysis` (an
+    (analysis, source) pair) skip those lookups when already computed (see
+    run_engine_batch). `analysis` is the analysis mode.
+    """
+    from chart import generate_chart
+
+    technical_signals = {
+        "ema_alignment": "bullish" if indicators["ema20"] > indicators["ema50"] else "bearish",
+        "rsi": "overbought" if indicators["rsi"] > 70 else "oversold" if indicators["rsi"] < 30 else "neutral",
+        "macd": "bullish" if indicators["macd"]["value"] > indicators["macd"]["signal"] else "bearish" if indicators["macd"]["value"] < indicators["macd"]["signal"] else "neutral"
+    }
+    price = safe_float(price_data.get("price"))
+    low = safe_float(price_data.get("low"))
+    high = safe_float(price_data.get("high"))
+    volume = safe_int(price_data.get("volume"))
+    avg_volume = safe_int(price_data.get("avg_volume"))
+    change_percent = safe_float(price_data.get("change_percent"))
+
+    alerts = []
+    # ----------------- Technical Indicators -----------------
+    #indicators = get_technical_indicators(resolved_symbol)
+
+    technical_analysis = {}
+    technical_score = 0
+
+    # ----------------- Sentiment -----------------
+    result = sentiment if sentiment is not None else get_sentiment(resolved_symbol)
+
+    s_type = result.get("sentiment_label", "Neutral")
+    if s_type == "Bullish" or s_type == "accumulation":
+        alerts.append("buy_signal")
+    elif s_type == "Hype":
+        alerts.append("trap_warning")
+    elif s_type == "Bearish" or s_type == "distribution":
+        alerts.append("sell_signal")
+
+    suggested_entry = None
+    if low is not None and high is not None:
+        suggested_entry = {
+            "lower": round(low * 0.99, 2),
+            "upper": round(low * 1.02, 2)
+        }
+
+    try:
+        chart_base64 = generate_chart(resolved_symbol, market_data)
+    except Exception as e:
+        logging.warning(f"Chart generation failed for {resolved_symbol}: {e}")
+        chart_base64 = None
+
+    if ai_analysis is None:
+        asset = (resolved_symbol, price_data, result.get("sentiment_score", 0), indicators)
+        daily = {resolved_symbol: market_data.daily} if market_data is not None else None
+        ai_analysis = analyze_assets([asset], analysis, daily)[resolved_symbol]
+    ai_analysis, analysis_source = ai_analysis
+
+    # Confidence Breakdown
+    confidence_breakdown = {
+        "technical": technical_score,
+        "sentiment": int(result.get("confidence", 0) * 100),
+        "volume": 60 if volume and avg_volume and volume > avg_volume else 45,
+        "price_action": 60,  # Can improve later
+        "trend": 65 if technical_score > 60 else 50,
+        "signals": technical_signals  # Added technical signals
+    }
+
+    # Total Confidence
+    confidence_breakdown["total"] = round(
+        confidence_breakdown["technical"] * 0.30 +
+        confidence_breakdown["volume"] * 0.20 +
+        confidence_breakdown["sentiment"] * 0.15 +
+        confidence_breakdown["price_action"] * 0.20 +
+        confidence_breakdown["trend"] * 0.15
+    )
+
+    overall_confidence = round(
+        confidence_breakdown["technical"] * 0.30 +
+        confidence_breakdown["volume"] * 0.20 +
+        confidence_breakdown["sentiment"] * 0.15 +
+        confidence_breakdown["price_action"] * 0.20 +
+        confidence_breakdown["trend"] * 0.15
+    )
+
+
+    return {
+        "symbol": resolved_symbol,
+        "price": price,
+        "low": low,
+        "high": high,
+        "volume": volume,
+        "avg_volume": avg_volume,
+        "change_percent": change_percent,
+
+        "sentiment_score": safe_float(result.get("sentiment_score", 0)),
+        "sentiment_label": result.get("sentiment_label", "Neutral"),
+
+        "confidence": overall_confidence,
+        "confidence_breakdown": confidence_breakdown,
+
+        "technical_indicators": indicators,
+        "technical_analysis": technical_analysis,
+
+        "emoji": result.get("emoji", "⚪"),
+        "explanation": technical_analysis.get("reason", ""),
+        "alerts": alerts,
+        "suggested_entry": suggested_entry,
+        "chart": chart_base64,
+        "ai_analysis": ai_analysis,
+        "analysis_source": analysis_source
+    }
+
+
+
+
+def run_engine(symbol, entry_price=None, analysis=ANALYSIS_MODE):
+    try:
+        check_analysis_mode(analysis)
+        import pandas as pd
+        from market import get_market_data
+        from indicators import calculate_indicators_from_price, sanitize_indicators
+        from indicator_state import update_indicators
+
+        symbols = resolve_candidates(symbol)
+        if not symbols:
+            return {"symbol": symbol, "error": "Could not extract candidate symbol", "alerts": ["error"]}
+
+        # Candidates are probed in parallel; the first one in priority order with data wins.
+        # Its daily bars feed the quote and the indicators; the chart reads intraday bars.
+        outcomes = {}
+        market_data = get_market_data(symbols, concurrent=True, outcomes=outcomes)
+        price_data = market_data.quote() if market_data else None
+        if not price_data and symbols == [symbol_cache.get_resolved(symbol)]:
+            # The cached ticker came back empty: forget it and fall back to a
+            # full resolution instead of reporting the text as unknown
+            record_resolution(symbol, [s for s in symbols if outcomes.pop(s, None) is False], None)
+            retry = [s for s in resolve_candidates(symbol, use_cache=False) or [] if s not in symbols]
+            if retry:
+                symbols = symbols + retry
+                market_data = get_market_data(retry, concurrent=True, outcomes=outcomes)
+                price_data = market_data.quote() if market_data else None
+        resolved_symbol = market_data.symbol if price_data else None
+        indicators = None
+        if price_data and market_data.daily is not None:
+            # Incremental state: only bars since the last run are folded in
+            indicators = sanitize_indicators(update_indicators(resolved_symbol, market_data.closes()))
+        elif price_data:  # only calculate indicators if price_data exists
+            temp_df = pd.DataFrame({
+                "Close": price_data.get("history", [price_data.get("price")])
+            })
+            indicators = calculate_indicators_from_price(temp_df)
+            indicators = sanitize_indicators(indicators)
+            # Ensure numeric defaults if any indicator is None
+            if not indicators:
+                indicators = dict(DEFAULT_INDICATORS)
+
+        # Only probes that finished without data count as failures; ones the
+        # timeout cut off are unknown and must not be negatively cached
+        tried = [s for s in symbols if s == resolved_symbol or outcomes.get(s) is False]
+        record_resolution(symbol, tried, resolved_symbol)
+
+        if not price_data:
+            logging.warning("No price data found.")
+            return {
+                "symbol": symbols,
+                "error": "No price data found",
+                "alerts": ["error"]
+            }
+
+        return build_engine_result(resolved_symbol, price_data, indicators, market_data, analysis=analysis)
+
     except Exception as e:
         logging.error(f"Engine failed: {str(e)}")
         return {
@@ -437,15 +719,253 @@ def run_engine(symbol, entry_price=None):
             "alerts": ["error"]
         }
 
+
+def run_engine_batch(symbols, workers=8, analysis=ANALYSIS_MODE):
+    """
+    Analyze many symbols at once.
+
+    Candidates are resolved concurrently, daily OHLCV for every symbol is fetched
+    with bulk yf.download calls (one round per candidate rank, so a symbol
+    only falls through to its next suffix if the previous one had no data),
+    and indicators are updated incrementally from each symbol's saved state.
+    Returns one result per input symbol, in order; a failure for one symbol
+    becomes an error entry and never affects the others.
+    """
+    from market import download_history_bulk, MarketData, CONTEXT_PERIOD, CONTEXT_INTERVAL
+    from indicators import sanitize_indicators
+    from indicator_state import update_indicators_batch
+    from chart import generate_charts
+
+    check_analysis_mode(analysis)
+    symbols = list(symbols)
+    results = [None] * len(symbols)
+    candidates = {}
+    cache_hits = set()
+
+    def resolve(i):
+        try:
+            found = resolve_candidates(symbols[i])
+            if not found:
+                results[i] = {"symbol": symbols[i], "error": "Could not extract candidate symbol", "alerts": ["error"]}
+            else:
+                candidates[i] = found
+                if found == [symbol_cache.get_resolved(symbols[i])]:
+                    cache_hits.add(i)
+        except Exception as e:
+            logging.error(f"Symbol resolution failed for {symbols[i]}: {e}")
+            results[i] = {"symbol": symbols[i], "error": str(e), "alerts": ["error"]}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(resolve, range(len(symbols))))
+
+    # Bulk-download one candidate rank at a time
+    resolved = {}
+    histories = {}
+    failed = set()
+    rank = 0
+    pending = set(candidates)
+    while pending:
+        wanted = {i: candidates[i][rank] for i in pending if rank < len(candidates[i])}
+        if not wanted and pending & cache_hits:
+            # Cached tickers that came back empty fall back to a full resolution
+            for i in pending & cache_hits:
+                found = resolve_candidates(symbols[i], use_cache=False) or []
+                candidates[i] = candidates[i] + [t for t in found if t not in candidates[i]]
+            cache_hits -= pending
+            continue
+        if not wanted:
+            break
+        fetched = download_history_bulk([t for t in wanted.values() if t not in histories],
+                                        period=CONTEXT_PERIOD, interval=CONTEXT_INTERVAL, failed=failed)
+        histories.update(fetched)
+        for i, ticker in wanted.items():
+            if ticker in histories:
+                resolved[i] = ticker
+            # A failed or all-empty chunk says nothing definite about its tickers
+            record_resolution(symbols[i], [ticker], resolved.get(i), transient=failed)
+        pending -= set(resolved)
+        rank += 1
+
+    for i in candidates:
+        if i not in resolved:
+            logging.warning(f"No price data found for {symbols[i]}.")
+            results[i] = {"symbol": candidates[i], "error": "No price data found", "alerts": ["error"]}
+
+    tickers = sorted(set(resolved.values()))
+    market_data = {t: MarketData(t, daily=histories[t]) for t in tickers}
+    indicators = update_indicators_batch({t: market_data[t].closes() for t in tickers})
+    indicators = {t: sanitize_indicators(values) for t, values in indicators.items()}
+
+    # Render every chart at once in the chart process pool (one bulk read of
+    # the intraday bars); build_engine_result then finds them in the chart cache
+    if len(tickers) > 1:
+        try:
+            generate_charts(tickers, output="hash")
+        except Exception as e:
+            logging.warning(f"Batch chart rendering failed: {e}")
+
+    quotes, sentiments = {}, {}
+
+    def prepare(ticker):
+        try:
+            quotes[ticker] = market_data[ticker].quote()
+            if quotes[ticker]:
+                sentiments[ticker] = get_sentiment(ticker)
+        except Exception as e:
+            logging.error(f"Quote failed for {ticker}: {e}")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(prepare, tickers))
+
+    # One Groq request per GROQ_BATCH_SIZE symbols instead of one each
+    indicators = {t: indicators.get(t) or dict(DEFAULT_INDICATORS) for t in tickers}
+    assets = [(t, quotes[t], sentiments[t].get("sentiment_score", 0), indicators[t]) for t in sentiments]
+    analyses = analyze_assets(assets, analysis, {t: market_data[t].daily for t in sentiments}, workers)
+
+    def finish(i):
+        ticker = resolved[i]
+        try:
+            price_data = quotes.get(ticker)
+            if not price_data:
+                results[i] = {"symbol": ticker, "error": "No price data found", "alerts": ["error"]}
+                return
+            results[i] = build_engine_result(ticker, price_data, indicators[ticker], market_data[ticker],
+                                             sentiment=sentiments.get(ticker), ai_analysis=analyses.get(ticker),
+                                             analysis=analysis)
+        except Exception as e:
+            logging.error(f"Engine failed for {symbols[i]}: {e}")
+            results[i] = {"symbol": symbols[i], "error": str(e), "alerts": ["error"]}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(finish, sorted(resolved)))
+
+    return results
+
+# ------------------- Worker Mode -------------------
+def warm_up():
+    """
+    Load the heavy modules and clients that run_engine otherwise imports
+    lazily, so the first request served by a worker is not a cold start.
+    """
+    import pandas  # noqa: F401
+    import market  # noqa: F401
+    import indicators  # noqa: F401
+    import chart
+    import twitter
+
+    chart.get_figure()
+    twitter.get_sia()
+    if twitter.SENTIMENT_SCORER == "transformer":
+        twitter.get_transformer()
+    try:
+        get_groq_client()
+    except Exception as e:
+        logging.warning(f"Groq client warm-up failed: {e}")
+
+def handle_request(request):
+    """
+    Dispatch a single worker request (a decoded JSON object) to the engine.
+    """
+    if request.get("stats"):
+        import llm_cache
+        import groq_dispatch
+        from twitter import sentiment_cache
+        stats = {"llm_cache": llm_cache.cache_stats(), "sentiment_cache": sentiment_cache.stats()}
+        if groq_dispatch._dispatcher is not None:
+            stats["groq"] = dict(groq_dispatch._dispatcher.stats)
+        return stats
+
+    analysis = request.get("analysis", ANALYSIS_MODE)
+    if request.get("symbols"):
+        return run_engine_batch(request["symbols"], analysis=analysis)
+
+    symbol = request.get("symbol")
+    if not symbol:
+        return {"error": "Missing symbol", "alerts": ["error"]}
+    return run_engine(symbol, request.get("entry"), analysis=analysis)
+
+
+def serve(workers=4, stream_in=None, stream_out=None):
+    """
+    Long-lived worker: reads newline-delimited JSON requests from stdin and
+    writes one JSON line per response to stdout, keeping every module and
+    client warm between requests.
+
+    Request:  {"id": "42", "symbol": "SBIN", "entry": 512.5}
+              {"id": "43", "symbols": ["SBIN", "TCS"], "analysis": "hybrid"}
+    Response: {"id": "42", "result": {...}}  (a list of results for "symbols")
+
+    Requests run on a pool of `workers` threads, so responses may arrive out
+    of order and must be matched by id.
+    """
+    stream_in = stream_in or sys.stdin
+    stream_out = stream_out or sys.stdout
+
+    # Modules print progress to stdout; keep the protocol channel clean.
+    sys.stdout = sys.stderr
+
+    write_lock = threading.Lock()
+
+    def respond(payload):
+        line = json.dumps(payload, ensure_ascii=False)
+        with write_lock:
+            stream_out.write(line + "\n")
+            stream_out.flush()
+
+    def process(request_id, request):
+        try:
+            result = handle_request(request)
+            respond({"id": request_id, "result": result})
+        except Exception as e:
+            logging.error(f"Worker request {request_id} failed: {e}")
+            respond({"id": request_id, "error": str(e)})
+
+    warm_up()
+    logging.info(f"Engine worker ready with {workers} workers.")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for line in stream_in:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except Exception as e:
+                respond({"id": None, "error": f"Invalid JSON request: {e}"})
+                continue
+            if not isinstance(request, dict):
+                respond({"id": None, "error": "Request must be a JSON object"})
+                continue
+            pool.submit(process, request.get("id"), request)
+
+    logging.info("Engine worker input closed, shutting down.")
+
 # ------------------- Entry Point -------------------
 if __name__ == "__main__":
     logging.info("Engine started via command line.")
     parser = argparse.ArgumentParser()
-    parser.add_argument("symbol")
+    parser.add_argument("symbols", nargs="*",
+                        help="One symbol (or free-text query), or several for a batch run")
     parser.add_argument("--entry", type=float)
+    parser.add_argument("--serve", action="store_true",
+                        help="Run as a long-lived NDJSON worker on stdin/stdout")
+    parser.add_argument("--workers", type=int,
+                        default=int(os.environ.get("ENGINE_WORKERS", 4)),
+                        help="Concurrent requests handled in --serve mode")
+    parser.add_argument("--analysis", choices=ANALYSIS_MODES, default=ANALYSIS_MODE,
+                        help="AI analysis: local (no LLM), llm, or hybrid (LLM only when local signals conflict)")
     args = parser.parse_args()
 
-    result = run_engine(args.symbol, args.entry)
+    if args.serve:
+        ANALYSIS_MODE = args.analysis
+        serve(workers=max(1, args.workers))
+        sys.exit(0)
+
+    if not args.symbols:
+        parser.error("symbol is required unless --serve is given")
+
+    if len(args.symbols) > 1:
+        result = run_engine_batch(args.symbols, analysis=args.analysis)
+    else:
+        result = run_engine(args.symbols[0], args.entry, analysis=args.analysis)
     sys.stdout.write(json.dumps(result, ensure_ascii=False))
     sys.stdout.flush()
-   
@@ -0,0 +1,218 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+
+# ------------------- Groq Dispatcher -------------------
+# Every Groq chat completion in the process goes through one asyncio loop
+# running on a background thread, so requests from all engine threads share
+# one set of limits:
+#   concurrency  at most GROQ_CONCURRENCY requests in flight
+#   budgets      GROQ_RPM requests and GROQ_TPM tokens per minute, as token
+#                buckets; a request reserves its prompt estimate plus
+#                max_tokens and is trued up from the reported usage
+#   deadlines    each request (all attempts included) fails after
+#                GROQ_DEADLINE seconds
+#   retries      429, 5xx, timeouts and connection errors are retried with
+#                full-jitter exponential backoff, honouring Retry-After
+# Sync callers use complete(); async code awaits acomplete(). GROQ_BASE_URL
+# points the client at another server, e.g. the fake one in check_llm.py.
+GROQ_RPM = int(os.getenv("GROQ_RPM", 30))
+GROQ_TPM = int(os.getenv("GROQ_TPM", 8000))
+GROQ_CONCURRENCY = int(os.getenv("GROQ_CONCURRENCY", 4))
+GROQ_DEADLINE = float(os.getenv("GROQ_DEADLINE", 60))
+GROQ_RETRIES = int(os.getenv("GROQ_RETRIES", 4))
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 20.0
+CHARS_PER_TOKEN = 4
+
+
+class Budget:
+    """
+    Token bucket holding `per_minute` units, refilled continuously.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """
+        Seconds until `amount` units are available (0 when they are now).
+        Requests larger than the bucket only wait for a full bucket.
+        """
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount):
+        self._refill()
+        self.level -= amount
+
+    def give(self, amount):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+def estimate_tokens(messages, max_tokens):
+    chars = sum(len(m["content"]) for m in messages)
+    return chars // CHARS_PER_TOKEN + max_tokens
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _is_retryable(error):
+    import groq
+
+    if isinstance(error, (asyncio.TimeoutError, groq.APITimeoutError, groq.APIConnectionError)):
+        return True
+    if isinstance(error, groq.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class Dispatcher:
+    def __init__(self, rpm=GROQ_RPM, tpm=GROQ_TPM, concurrency=GROQ_CONCURRENCY,
+                 deadline=GROQ_DEADLINE, retries=GROQ_RETRIES, api_key=None, base_url=None):
+        self.requests = Budget(rpm)
+        self.tokens = Budget(tpm)
+        self.concurrency = concurrency
+        self.deadline = deadline
+        self.retries = retries
+        self.api_key = api_key if api_key is not None else os.environ.get("GROQ_API_KEY")
+        self.base_url = base_url or os.environ.get("GROQ_BASE_URL")
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "tokens": 0, "throttled_seconds": 0.0}
+        self._loop = None
+        self._client = None
+        self._started = threading.Event()
+
+    # ----- event loop -----
+    def start(self):
+        """
+        Start the background loop thread (idempotent).
+        """
+        if not self._started.is_set():
+            thread = threading.Thread(target=self._run, name="groq-dispatch", daemon=True)
+            thread.start()
+            self._started.wait()
+        return self
+
+    def _run(self):
+        from groq import AsyncGroq
+
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        if not self.api_key:
+            logging.warning("GROQ_API_KEY not found in environment variables.")
+        # Retries and timeouts are handled here, not by the SDK
+        self._client = AsyncGroq(api_key=self.api_key or "missing", base_url=self.base_url, max_retries=0)
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._budget_lock = asyncio.Lock()
+        self._started.set()
+        self._loop.run_forever()
+
+    def complete(self, messages, model, max_tokens, temperature=0.3, deadline=None):
+        """
+        Blocking chat completion from any thread; returns the message text.
+        """
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(
+            self.acomplete(messages, model, max_tokens, temperature, deadline), self._loop
+        )
+        return future.result()
+
+    # ----- requests -----
+    async def _reserve(self, tokens, deadline_at):
+        # One waiter at a time, so requests are admitted in arrival order
+        async with self._budget_lock:
+            while True:
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                if wait <= 0:
+                    self.requests.take(1)
+                    self.tokens.take(tokens)
+                    return
+                if time.monotonic() + wait > deadline_at:
+                    raise asyncio.TimeoutError("Groq rate budget exceeds the request deadline")
+                self.stats["throttled_seconds"] += wait
+                await asyncio.sleep(wait)
+
+    async def acomplete(self, messages, model, max_tokens, temperature=0.3, deadline=None):
+        """
+        Chat completion under the concurrency cap, rate budgets and deadline.
+        Must run on the dispatcher loop (complete() takes care of that).
+        """
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        estimate = estimate_tokens(messages, max_tokens)
+        attempt = 0
+        while True:
+            await self._reserve(estimate, deadline_at)
+            self.stats["requests"] += 1
+            try:
+                async with self._slots:
+                    remaining = deadline_at - time.monotonic()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError("Groq request deadline exceeded")
+                    try:
+                        response = await asyncio.wait_for(
+                            self._client.chat.completions.create(
+                                messages=messages, model=model, max_tokens=max_tokens, temperature=temperature
+                            ),
+                            timeout=remaining
+                        )
+                    except asyncio.TimeoutError:
+                        raise asyncio.TimeoutError("Groq request deadline exceeded") from None
+            except Exception as e:
+                # A failed attempt consumed no completion tokens
+                self.tokens.give(estimate)
+                retry_after = _retry_after(e)
+                backoff = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+                delay = max(backoff, retry_after or 0.0)
+                if (not _is_retryable(e) or attempt >= self.retries
+                        or time.monotonic() + delay >= deadline_at):
+                    self.stats["failures"] += 1
+                    raise
+                attempt += 1
+                self.stats["retries"] += 1
+                logging.warning(f"Groq request failed ({e}), retry {attempt} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            # True up the token reservation with what was actually used
+            usage = getattr(response, "usage", None)
+            used = getattr(usage, "total_tokens", None) or estimate
+            self.stats["tokens"] += used
+            if used < estimate:
+                self.tokens.give(estimate - used)
+            else:
+                self.tokens.take(used - estimate)
+            return response.choices[0].message.content
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher():
+    """
+    Process-wide dispatcher, started on first use.
+    """
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = Dispatcher().start()
+    return _dispatcher
@@ -0,0 +1,284 @@
+import json
+import math
+import logging
+import numpy as np
+from storage import connect
+
+# ------------------- Incremental Indicators -------------------
+# Constant-time-per-bar version of indicators.calculate_indicators_from_price.
+# The running state (EMAs, MACD signal, the 14-bar RSI window) is kept
+# per symbol and interval in SQLite, so polling a watchlist only folds in the
+# bars that arrived since the previous poll.
+#
+# The last bar is usually still forming (today's session), so the state is
+# saved as of the bar before it and everything after that bar is re-applied
+# on the next update. Symbols without usable saved state are rebuilt
+# together with the vectorized indicators.calculate_indicators_matrix kernel.
+RSI_PERIOD = 14
+EMA_SPANS = {"ema20": 20, "ema50": 50, "ema12": 12, "ema26": 26}
+SIGNAL_SPAN = 9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS indicator_state (
+    symbol TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (symbol, interval)
+);
+"""
+
+
+def _alpha(span):
+    return 2.0 / (span + 1.0)
+
+
+class IndicatorState:
+    """
+    Running indicator state. update() folds in one close in O(1).
+    Matches calculate_indicators_from_price (adjust=False EMAs, rolling-mean
+    RSI, forward-filled closes) bar for bar.
+    """
+
+    def __init__(self, data=None):
+        data = data or {}
+        self.count = data.get("count", 0)
+        self.close = data.get("close")
+        self.ema = data.get("ema", {})
+        self.signal = data.get("signal")
+        self.moves = data.get("moves", [])  # last RSI_PERIOD (gain, loss) pairs
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "close": self.close,
+            "ema": dict(self.ema),
+            "signal": self.signal,
+            "moves": [list(m) for m in self.moves],
+        }
+
+    def copy(self):
+        return IndicatorState(self.to_dict())
+
+    def update(self, close):
+        if close is None or (isinstance(close, float) and math.isnan(close)):
+            close = self.close if self.close is not None else 0.0  # ffill, then 0.0
+        close = float(close)
+
+        if self.count == 0:
+            self.ema = {name: close for name in EMA_SPANS}
+        else:
+            for name, span in EMA_SPANS.items():
+                a = _alpha(span)
+                self.ema[name] = a * close + (1 - a) * self.ema[name]
+
+            delta = close - self.close
+            gain, loss = max(delta, 0.0), max(-delta, 0.0)
+            self.moves.append([gain, loss])
+            if len(self.moves) > RSI_PERIOD:
+                self.moves.pop(0)
+
+        macd = self.ema["ema12"] - self.ema["ema26"]
+        if self.count == 0:
+            self.signal = macd
+        else:
+            a = _alpha(SIGNAL_SPAN)
+            self.signal = a * macd + (1 - a) * self.signal
+
+        self.close = close
+        self.count += 1
+
+    def indicators(self):
+        """
+        Current values in the calculate_indicators_from_price format.
+        """
+        def safe(val, default=0.0):
+            if val is None or math.isnan(val):
+                return default
+            return round(val, 4)
+
+        if self.count == 0:
+            return {
+                "ema20": 0.0,
+                "ema50": 0.0,
+                "rsi": 50.0,
+                "macd": {"value": 0.0, "signal": 0.0, "histogram": 0.0}
+            }
+
+        rsi = None
+        if self.moves:
+            avg_gain = sum(m[0] for m in self.moves) / len(self.moves)
+            avg_loss = sum(m[1] for m in self.moves) / len(self.moves)
+            if avg_loss != 0:
+                rsi = 100 - (100 / (1 + avg_gain / avg_loss))
+
+        macd = self.ema["ema12"] - self.ema["ema26"]
+        return {
+            "ema20": safe(self.ema["ema20"]),
+            "ema50": safe(self.ema["ema50"]),
+            "rsi": safe(rsi, default=50.0),
+            "macd": {
+                "value": safe(macd),
+                "signal": safe(self.signal),
+                "histogram": safe(macd - self.signal)
+            }
+        }
+
+# ------------------- Persistence -------------------
+def _db():
+    return connect("indicators", SCHEMA)
+
+
+def _load(symbols, interval):
+    states = {}
+    try:
+        placeholders = ",".join("?" * len(symbols))
+        rows = _db().execute(
+            f"SELECT symbol, state FROM indicator_state WHERE interval = ? AND symbol IN ({placeholders})",
+            (interval, *symbols)
+        )
+        for symbol, state in rows:
+            states[symbol] = json.loads(state)
+    except Exception as e:
+        logging.warning(f"Indicator state read failed: {e}")
+    return states
+
+
+def _save(records, interval):
+    try:
+        db = _db()
+        db.execute("BEGIN")
+        db.executemany(
+            "INSERT OR REPLACE INTO indicator_state (symbol, interval, state) VALUES (?, ?, ?)",
+            [(symbol, interval, json.dumps(state)) for symbol, state in records.items()]
+        )
+        db.execute("COMMIT")
+    except Exception as e:
+        logging.warning(f"Indicator state write failed: {e}")
+        try:
+            db.execute("ROLLBACK")
+        except Exception:
+            pass
+
+
+def _resume(saved, closes):
+    """
+    (state, index of the first bar to fold in) continuing from the saved
+    base, or None when the base bar is gone or its close changed (history
+    was re-adjusted) and the series must be rebuilt.
+    """
+    stamps = closes.index.asi8 if len(closes) else []
+    if saved and saved.get("base_ts") is not None and len(stamps):
+        pos = int(np.searchsorted(stamps, saved["base_ts"]))
+        if pos < len(stamps) and stamps[pos] == saved["base_ts"] and \
+                _same_close(closes.iat[pos], saved.get("base_close")):
+            return IndicatorState(saved["base"]), pos + 1
+    return None
+
+
+def _rebuild(closes_by_symbol):
+    """
+    (state, start) for series rebuilt from scratch: every bar but the last
+    is folded in at once, for all symbols together, by the vectorized
+    kernel; _advance applies the last one.
+    """
+    from indicators import calculate_indicators_matrix
+
+    # Same missing-close handling as IndicatorState.update: ffill, then 0.0
+    rows = {
+        symbol: closes.iloc[:-1].astype(float).ffill().fillna(0.0).to_numpy()
+        for symbol, closes in closes_by_symbol.items()
+    }
+    built = {symbol: (IndicatorState(), 0) for symbol, row in rows.items() if not len(row)}
+    rows = {symbol: row for symbol, row in rows.items() if len(row)}
+    if not rows:
+        return built
+
+    matrix = np.full((len(rows), max(len(row) for row in rows.values())), np.nan)
+    for i, row in enumerate(rows.values()):
+        matrix[i, :len(row)] = row
+    values = calculate_indicators_matrix(matrix, rsi_period=RSI_PERIOD)
+
+    for i, (symbol, row) in enumerate(rows.items()):
+        deltas = np.diff(row)[-RSI_PERIOD:]
+        state = IndicatorState({
+            "count": len(row),
+            "close": float(row[-1]),
+            "ema": {name: float(values[name][i]) for name in EMA_SPANS},
+            "signal": float(values["macd"]["signal"][i]),
+            "moves": [[max(d, 0.0), max(-d, 0.0)] for d in deltas.tolist()],
+        })
+        built[symbol] = (state, len(row))
+    return built
+
+
+def _advance(saved, closes, resumed=None):
+    """
+    Fold the bars of `closes` (a pandas Series indexed by time) that come
+    after the saved base into the state, or after `resumed` (state, start)
+    when given. Rebuilds from the whole series when there is no usable base.
+    Returns (new saved state, indicators).
+    """
+    stamps = closes.index.asi8 if len(closes) else []
+    state, start = resumed or _resume(saved, closes) or (IndicatorState(), 0)
+
+    values = closes.iloc[start:].tolist()
+    if not values:
+        return saved, state.indicators()
+
+    for value in values[:-1]:
+        state.update(value)
+    base = state.copy()
+    state.update(values[-1])
+
+    if len(stamps) > 1:
+        saved = {
+            "base": base.to_dict(),
+            "base_ts": int(stamps[-2]),
+            "base_close": _json_close(closes.iat[-2]),
+        }
+    else:
+        saved = None
+    return saved, state.indicators()
+
+
+def _json_close(value):
+    return None if value is None or math.isnan(value) else float(value)
+
+
+def _same_close(value, saved_close):
+    value = _json_close(value)
+    if value is None or saved_close is None:
+        return value is None and saved_close is None
+    return math.isclose(value, saved_close, rel_tol=1e-9, abs_tol=1e-12)
+
+
+def update_indicators_batch(closes_by_symbol, interval="1d"):
+    """
+    Incrementally update indicators for {symbol: close Series}.
+    Only bars newer than each symbol's saved state are processed.
+    Returns {symbol: indicators dict}.
+    """
+    symbols = list(closes_by_symbol)
+    if not symbols:
+        return {}
+
+    saved = _load(symbols, interval)
+    resumed = {symbol: _resume(saved.get(symbol), closes_by_symbol[symbol]) for symbol in symbols}
+    resumed.update(_rebuild({s: closes_by_symbol[s] for s in symbols if resumed[s] is None}))
+    results, changed = {}, {}
+    for symbol in symbols:
+        state, values = _advance(saved.get(symbol), closes_by_symbol[symbol], resumed[symbol])
+        results[symbol] = values
+        if state is not None and state != saved.get(symbol):
+            changed[symbol] = state
+
+    if changed:
+        _save(changed, interval)
+    return results
+
+
+def update_indicators(symbol, closes, interval="1d"):
+    """
+    Incrementally update and return one symbol's indicators.
+    """
+    return update_indicators_batch({symbol: closes}, interval)[symbol]
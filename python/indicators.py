@@ -84,3 +84,103 @@ def calculate_indicators_from_price(data):
             "histogram": safe_float(macd_hist)
         }
     }
+
+def calculate_indicators_matrix(closes, rsi_period=14):
+    """
+    Vectorized EMA20, EMA50, RSI and MACD for a 2-D close array
+    (symbols x bars) in one pass over the bar axis.
+
+    NaN marks a missing bar: rows may be left- or right-padded or have gaps.
+    Each row is compacted to its own valid bars first, so every symbol gets
+    the values a single-symbol run over just its bars would give.
+    Returns {"ema20": arr, "ema50": arr, "rsi": arr,
+             "macd": {"value": arr, "signal": arr, "histogram": arr},
+             "ema12": arr, "ema26": arr}
+    with one entry per row and NaN where a row has no data;
+    split_indicators turns it into per-symbol dicts.
+    """
+    closes = np.asarray(closes, dtype=float)
+    if closes.ndim == 1:
+        closes = closes[np.newaxis, :]
+    n_rows, n_bars = closes.shape
+
+    # Move each row's valid bars to the front, keeping their order
+    missing = np.isnan(closes)
+    order = np.argsort(missing, axis=1, kind="stable")
+    packed = np.take_along_axis(closes, order, axis=1)
+    lengths = n_bars - missing.sum(axis=1)
+
+    def alpha(span):
+        return 2.0 / (span + 1.0)
+
+    nan_row = np.full(n_rows, np.nan)
+    ema20, ema50, ema12, ema26, signal = (nan_row.copy() for _ in range(5))
+    for t in range(n_bars):
+        x = packed[:, t]
+        active = t < lengths
+        first = t == 0
+        for ema, span in ((ema20, 20), (ema50, 50), (ema12, 12), (ema26, 26)):
+            a = alpha(span)
+            step = x if first else a * x + (1 - a) * ema
+            np.copyto(ema, step, where=active)
+        macd_t = ema12 - ema26
+        a = alpha(9)
+        step = macd_t if first else a * macd_t + (1 - a) * signal
+        np.copyto(signal, step, where=active)
+
+    macd_line = ema12 - ema26
+
+    # RSI: mean gain / mean loss over each row's last `rsi_period` moves
+    rsi = nan_row.copy()
+    if n_bars > 1:
+        deltas = np.diff(packed, axis=1)
+        back = np.arange(rsi_period)
+        pos = (lengths - 2)[:, np.newaxis] - back  # delta index of the k-th latest move
+        valid = pos >= 0
+        moves = np.take_along_axis(deltas, np.clip(pos, 0, None), axis=1)
+        moves = np.where(valid, moves, 0.0)
+        count = valid.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            avg_gain = np.clip(moves, 0, None).sum(axis=1) / count
+            avg_loss = np.clip(-moves, 0, None).sum(axis=1) / count
+            rs = avg_gain / np.where(avg_loss == 0, np.nan, avg_loss)
+            rsi = 100 - (100 / (1 + rs))
+
+    return {
+        "ema20": ema20,
+        "ema50": ema50,
+        "rsi": rsi,
+        "macd": {
+            "value": macd_line,
+            "signal": signal,
+            "histogram": macd_line - signal
+        },
+        "ema12": ema12,
+        "ema26": ema26
+    }
+
+
+def split_indicators(matrix):
+    """
+    Per-row indicator dicts from calculate_indicators_matrix output, rounded
+    like calculate_indicators_from_price, with None for missing values
+    (sanitize_indicators fills in the neutral defaults).
+    """
+    def value(arr, i):
+        val = float(arr[i])
+        return None if np.isnan(val) else round(val, 4)
+
+    macd = matrix["macd"]
+    return [
+        {
+            "ema20": value(matrix["ema20"], i),
+            "ema50": value(matrix["ema50"], i),
+            "rsi": value(matrix["rsi"], i),
+            "macd": {
+                "value": value(macd["value"], i),
+                "signal": value(macd["signal"], i),
+                "histogram": value(macd["histogram"], i)
+            }
+        }
+        for i in range(len(matrix["ema20"]))
+    ]
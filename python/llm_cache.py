@@ -0,0 +1,202 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+from storage import connect
+
+# ------------------- LLM Response Cache -------------------
+# Chat completion results keyed by a hash of the model, the request
+# parameters and the normalized messages, shared by every engine process
+# through SQLite. Identical requests that arrive while one is in flight wait
+# for it instead of calling the API again (single-flight): threads of one
+# process share a Future; across processes the first caller takes a short
+# lease on the key and the others poll the cache until it is filled or the
+# lease is released or expires. Only identical requests ever wait.
+CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 900))
+LEASE_TTL = int(os.getenv("LLM_LEASE_TTL", 90))
+LEASE_POLL = 0.2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+);
+"""
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "coalesced": 0, "stored": 0, "errors": 0}
+_stats_lock = threading.Lock()
+
+
+def _db():
+    return connect("llm", SCHEMA)
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def normalize_prompt(text):
+    """
+    Ignore whitespace-only differences: trailing spaces, indentation of
+    blank lines and runs of blank lines.
+    """
+    lines = [line.rstrip() for line in (text or "").strip().splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+
+
+def cache_key(model, params, messages):
+    payload = {
+        "model": model,
+        "params": params,
+        "messages": [{"role": m["role"], "content": normalize_prompt(m["content"])} for m in messages],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def get(key):
+    try:
+        row = _db().execute(
+            "SELECT response FROM responses WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+    except Exception as e:
+        logging.warning(f"LLM cache read failed: {e}")
+        return None
+
+
+def put(key, model, response, ttl=CACHE_TTL):
+    try:
+        db = _db()
+        db.execute(
+            "INSERT OR REPLACE INTO responses (key, model, response, expires_at) VALUES (?, ?, ?, ?)",
+            (key, model, json.dumps(response), time.time() + ttl)
+        )
+        db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        _count("stored")
+    except Exception as e:
+        logging.warning(f"LLM cache write failed: {e}")
+
+
+def _acquire_lease(key):
+    """
+    Claim the in-flight lease for `key`; False while another process holds
+    a live one. Fails open so a broken cache never blocks a request.
+    """
+    db = _db()
+    try:
+        db.execute("BEGIN IMMEDIATE")
+        now = time.time()
+        db.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+        claimed = db.execute(
+            "INSERT OR IGNORE INTO leases (key, expires_at) VALUES (?, ?)", (key, now + LEASE_TTL)
+        ).rowcount == 1
+        db.execute("COMMIT")
+        return claimed
+    except Exception as e:
+        logging.warning(f"LLM cache lease failed: {e}")
+        try:
+            db.execute("ROLLBACK")
+        except Exception:
+            pass
+        return True
+
+
+def _release_lease(key):
+    try:
+        _db().execute("DELETE FROM leases WHERE key = ?", (key,))
+    except Exception as e:
+        logging.warning(f"LLM cache lease release failed: {e}")
+
+
+def _lead(key, model, call, ttl):
+    """
+    Wait out another process's identical request, then re-check the cache
+    and call upstream under the lease.
+    """
+    while not _acquire_lease(key):
+        time.sleep(LEASE_POLL)
+        response = get(key)
+        if response is not None:
+            _count("hits")
+            return response
+    try:
+        response = get(key)
+        if response is not None:
+            _count("hits")
+            return response
+        _count("misses")
+        response = call()
+        if isinstance(response, dict) and "error" not in response:
+            put(key, model, response, ttl)
+        else:
+            _count("errors")
+        return response
+    finally:
+        _release_lease(key)
+
+
+def cached_call(model, params, messages, call, ttl=CACHE_TTL):
+    """
+    Return the cached response for this request or run `call()` once for
+    all concurrent identical requests. Responses with an "error" key are
+    returned but never cached.
+    """
+    key = cache_key(model, params, messages)
+    response = get(key)
+    if response is not None:
+        _count("hits")
+        return response
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+
+    if not leader:
+        _count("coalesced")
+        # Each caller gets its own copy of the shared response
+        return json.loads(json.dumps(future.result()))
+
+    try:
+        response = _lead(key, model, call, ttl)
+        future.set_result(response)
+        return response
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def cache_stats():
+    """
+    Counters for this process plus the number of live shared entries.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+    stats["hit_rate"] = round((stats["hits"] + stats["coalesced"]) / lookups, 4) if lookups else 0.0
+    stats["in_flight"] = len(_inflight)
+    try:
+        stats["entries"] = _db().execute(
+            "SELECT COUNT(*) FROM responses WHERE expires_at > ?", (time.time(),)
+        ).fetchone()[0]
+    except Exception as e:
+        logging.warning(f"LLM cache read failed: {e}")
+    stats["ttl"] = CACHE_TTL
+    return stats
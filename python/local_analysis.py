@@ -0,0 +1,170 @@
+import numpy as np
+
+# ------------------- Local Analysis -------------------
+# Deterministic stand-in for the Groq analysis: the same JSON schema as
+# engine.build_groq_combined_prompt, derived from daily bars and the
+# indicators the engine already has. No network, no model.
+#   levels      nearest classic floor pivot (previous session H/L/C) below
+#               and above the current price
+#   trade_plan  stop STOP_ATR x ATR beyond the entry, targets at
+#               TARGET_ATR multiples of ATR
+#   bias        vote of EMA20/50 alignment, MACD vs signal and RSI extremes
+ATR_PERIOD = 14
+STOP_ATR = 1.5
+TARGET_ATR = (1.0, 2.0, 3.0)
+EMA_FLAT = 0.001  # EMA20 within 0.1% of EMA50 counts as no alignment
+RISK_ATR_PERCENT = (1.5, 3.5)  # ATR as % of price: low below, high above
+RISKS = ("low", "moderate", "high")
+
+
+def atr(high, low, close, period=ATR_PERIOD):
+    """
+    Wilder's average true range of the last bar, or None with fewer than two bars.
+    """
+    high, low, close = (np.asarray(a, dtype=float) for a in (high, low, close))
+    if len(close) < 2:
+        return None
+    true_range = np.maximum(high[1:], close[:-1]) - np.minimum(low[1:], close[:-1])
+    value = true_range[:period].mean()
+    for tr in true_range[period:]:
+        value += (tr - value) / period
+    return float(value)
+
+
+def pivot_levels(high, low, close):
+    """
+    Classic floor pivots from one session's high, low and close.
+    """
+    pivot = (high + low + close) / 3
+    return {
+        "s3": low - 2 * (high - pivot),
+        "s2": pivot - (high - low),
+        "s1": 2 * pivot - high,
+        "p": pivot,
+        "r1": 2 * pivot - low,
+        "r2": pivot + (high - low),
+        "r3": high + 2 * (pivot - low),
+    }
+
+
+def technical_states(indicators):
+    """
+    ema_alignment, rsi_state and macd_state labels as in the analysis schema.
+    """
+    ema20, ema50 = indicators["ema20"], indicators["ema50"]
+    if ema50 and abs(ema20 - ema50) <= abs(ema50) * EMA_FLAT:
+        ema_alignment = "neutral"
+    else:
+        ema_alignment = "bullish" if ema20 > ema50 else "bearish"
+
+    rsi = indicators["rsi"]
+    rsi_state = "overbought" if rsi > 70 else "oversold" if rsi < 30 else "neutral"
+
+    macd = indicators["macd"]
+    if macd["value"] > macd["signal"]:
+        macd_state = "bullish"
+    elif macd["value"] < macd["signal"]:
+        macd_state = "bearish"
+    else:
+        macd_state = "neutral"
+    return {"ema_alignment": ema_alignment, "rsi_state": rsi_state, "macd_state": macd_state}
+
+
+def _votes(states):
+    # Oversold leans bullish (mean reversion), overbought bearish
+    rsi_vote = {"oversold": "bullish", "overbought": "bearish"}.get(states["rsi_state"], "neutral")
+    votes = [states["ema_alignment"], states["macd_state"], rsi_vote]
+    return votes.count("bullish"), votes.count("bearish")
+
+
+def signals_conflict(indicators):
+    """
+    True when at least one signal is bullish and another bearish; hybrid
+    mode asks the LLM only for these.
+    """
+    bullish, bearish = _votes(technical_states(indicators))
+    return bullish > 0 and bearish > 0
+
+
+def _levels(price, atr_value, daily):
+    if daily is not None and len(daily) >= 2:
+        previous = daily.iloc[-2]
+        pivots = sorted(pivot_levels(float(previous["High"]), float(previous["Low"]), float(previous["Close"])).values())
+        below = [level for level in pivots if level < price]
+        above = [level for level in pivots if level > price]
+        if below and above:
+            return below[-1], above[0]
+        if below:
+            return below[-1], price + atr_value
+        if above:
+            return price - atr_value, above[0]
+    return price - atr_value, price + atr_value
+
+
+def _reason(states, indicators):
+    parts = [
+        f"EMA20 {'above' if indicators['ema20'] > indicators['ema50'] else 'below'} EMA50"
+        if states["ema_alignment"] != "neutral" else "EMA20 flat against EMA50",
+        f"RSI {indicators['rsi']:.1f} {states['rsi_state']}",
+        f"MACD {states['macd_state']}",
+    ]
+    return ", ".join(parts)
+
+
+def analyze(symbol, price_data, sentiment_score, indicators, daily=None):
+    """
+    Analysis dict in the build_groq_combined_prompt schema. `daily` is the
+    symbol's daily OHLCV DataFrame (market.MarketData.daily); without it ATR
+    falls back to today's range and levels to price +/- ATR.
+    """
+    price = float(price_data.get("price") or 0.0)
+    atr_value = None
+    if daily is not None and len(daily) >= 2:
+        atr_value = atr(daily["High"], daily["Low"], daily["Close"])
+    if not atr_value:
+        high, low = price_data.get("high"), price_data.get("low")
+        atr_value = (high - low) if high is not None and low is not None and high > low else price * 0.01
+
+    states = technical_states(indicators)
+    bullish, bearish = _votes(states)
+    bias = "bullish" if bullish > bearish else "bearish" if bearish > bullish else "neutral"
+    conflict = bullish > 0 and bearish > 0
+
+    if bias == "bullish" and states["rsi_state"] != "overbought":
+        recommendation = "buy"
+    elif bias == "bearish" and states["rsi_state"] != "oversold":
+        recommendation = "sell"
+    else:
+        recommendation = "hold"
+
+    # Short plans mirror long ones; a hold is planned as a long
+    direction = -1 if recommendation == "sell" else 1
+    support, resistance = _levels(price, atr_value, daily)
+
+    atr_percent = atr_value / price * 100 if price else 0.0
+    risk = sum(atr_percent > limit for limit in RISK_ATR_PERCENT) + conflict
+    technical = 50 + 50 * abs(bullish - bearish) / 3 - (15 if conflict else 0)
+
+    return {
+        "predicted_move": {"bullish": "up", "bearish": "down"}.get(bias, "neutral"),
+        "technical_analysis": {
+            **states,
+            "technical_bias": bias,
+            "reason": _reason(states, indicators),
+        },
+        "confidence_hint": {
+            "technical": int(round(technical)),
+            "sentiment": int(min(max(sentiment_score or 0, 0), 100)),
+        },
+        "levels": {
+            "support": round(support, 4),
+            "resistance": round(resistance, 4),
+        },
+        "trade_plan": {
+            "entry": round(price, 4),
+            "stop_loss": round(price - direction * STOP_ATR * atr_value, 4),
+            "targets": [round(price + direction * k * atr_value, 4) for k in TARGET_ATR],
+        },
+        "risk": RISKS[min(risk, len(RISKS) - 1)],
+        "recommendation": recommendation,
+    }
@@ -1,7 +1,9 @@
+import os
 import yfinance as yf
 import pandas as pd
 import logging
-from alpha_vantage.timeseries import TimeSeries
+import ohlcv_store
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
 
 # Set up logging for better debugging
 logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s: %(message)s')
@@ -9,92 +11,271 @@ logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s: %(m
 # Alpha Vantage API Key (you need to sign up and get your API key from Alpha Vantage)
 ALPHA_VANTAGE_API_KEY = 'QJVIKMT22FGUEGZS'
 
-def get_price(symbol):
+# Concurrent candidate probing
+PROBE_WORKERS = int(os.getenv("PRICE_PROBE_WORKERS", 4))
+PROBE_TIMEOUT = float(os.getenv("PRICE_PROBE_TIMEOUT", 15))
+
+def get_price(symbol, concurrent=False, timeout=PROBE_TIMEOUT, max_workers=PROBE_WORKERS):
     """
     symbol can be:
     - "SBIN.NS"
     - "SBIN.BO"
     - ["SBIN.NS", "SBIN.BO"]  (recommended)
+
+    With concurrent=True a list of candidates is probed in parallel; the
+    result is still the first candidate in list order that has data.
     """
 
     symbols = symbol if isinstance(symbol, list) else [symbol]
 
-    for sym in symbols:
-        # First, try fetching data from Yahoo Finance
-        result = get_price_from_yahoo(sym)
-        if result:
-            return result
+    if concurrent and len(symbols) > 1:
+        return get_price_concurrent(symbols, timeout=timeout, max_workers=max_workers)
 
-        # If Yahoo Finance fails, try Alpha Vantage as a fallback        
-        result = get_price_from_alpha_vantage(sym)
+    for sym in symbols:
+        result = probe_price(sym)
         if result:
             return result
 
     logging.error(f"No valid data found for any of the symbols: {symbols}")
     return None
 
-def get_price_from_yahoo(symbol):
+def probe_price(sym):
+    # First, try fetching data from Yahoo Finance
+    result = get_price_from_yahoo(sym)
+    if result:
+        return result
+
+    # If Yahoo Finance fails, try Alpha Vantage as a fallback
+    return get_price_from_alpha_vantage(sym)
+
+def get_price_concurrent(symbols, timeout=PROBE_TIMEOUT, max_workers=PROBE_WORKERS, probe=None, outcomes=None):
+    """
+    Probe candidates on a bounded thread pool and return as soon as the
+    highest-priority success is known, i.e. a candidate has data and every
+    candidate before it has failed. Remaining probes are cancelled or
+    ignored. On timeout, the best success seen so far (if any) is returned.
+    `probe` defaults to probe_price. If `outcomes` is a dict it receives
+    symbol -> bool (had data) for every probe that finished; probes that
+    raised or were still running are left out.
+    """
+    probe = probe or probe_price
+    pending = object()
+    results = [pending] * len(symbols)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(symbols))))
+    futures = {pool.submit(probe, sym): i for i, sym in enumerate(symbols)}
     try:
-        ticker = yf.Ticker(symbol)
+        for future in as_completed(futures, timeout=timeout):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+                if outcomes is not None:
+                    outcomes[symbols[i]] = bool(results[i])
+            except Exception as e:
+                logging.error(f"Price probe failed for {symbols[i]}: {e}")
+                results[i] = None
 
-        # Fetch 5-day data (1-day interval)
-        data = ticker.history(period="5d", interval="1d")
+            for result in results:
+                if result is pending:
+                    break
+                if result:
+                    return result
+    except FuturesTimeout:
+        logging.warning(f"Price probing timed out after {timeout}s for {symbols}")
+        for result in results:
+            if result is not pending and result:
+                return result
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    logging.error(f"No valid data found for any of the symbols: {symbols}")
+    return None
 
-        if data is None or data.empty:
+# ------------------- Market Data Context -------------------
+# Daily bars from the local OHLCV store feed the quote and the indicators: a
+# year of official sessions, enough for EMA50 to settle, with the exchange's
+# own daily volume. Intraday bars are only used for the chart, which reads
+# them from the store itself unless they are passed in.
+CONTEXT_PERIOD = "1y"
+CONTEXT_INTERVAL = "1d"
+CHART_SESSIONS = 5
+
+class MarketData:
+    """
+    Shared market data for one symbol: daily bars, optional intraday bars
+    for the chart, or a bare quote when only the Alpha Vantage fallback
+    answered.
+    """
+
+    def __init__(self, symbol, bars=None, quote=None, daily=None):
+        self.symbol = symbol
+        self.bars = bars
+        self._quote = quote
+        self._daily = daily
+
+    @classmethod
+    def fetch(cls, symbol, period=CONTEXT_PERIOD, interval=CONTEXT_INTERVAL):
+        """
+        Daily bars for one symbol from the local OHLCV store, which
+        downloads only what it is missing (falling back to an Alpha Vantage
+        quote). Returns None when neither source has data.
+        """
+        try:
+            daily = ohlcv_store.get_bars(symbol, interval=interval, period=period)
+            if not daily.empty:
+                return cls(symbol, daily=daily)
             logging.warning(f"No data found for {symbol} from Yahoo Finance.")
-            return None
+        except Exception as e:
+            logging.error(f"Error fetching data for {symbol} from Yahoo Finance: {str(e)}")
 
-        data = data.dropna(how="all")
-        if data.empty:
-            logging.warning(f"Data is empty for {symbol}.")
-            return None
+        quote = get_price_from_alpha_vantage(symbol)
+        if quote:
+            return cls(symbol, quote=quote)
+        return None
 
-        last = data.iloc[-1]
+    @property
+    def daily(self):
+        """
+        Daily bars; when only intraday bars were given, those resampled to
+        one bar per exchange-local session.
+        """
+        if self._daily is None and self.bars is not None:
+            self._daily = self.bars.resample("1D").agg({
+                "Open": "first",
+                "High": "max",
+                "Low": "min",
+                "Close": "last",
+                "Volume": "sum"
+            }).dropna(subset=["Close"])
+        return self._daily
 
-        close = last.get("Close")
-        open_ = last.get("Open")
-        low = last.get("Low")
-        high = last.get("High")
-        volume = last.get("Volume")
+    def closes(self):
+        daily = self.daily
+        return daily["Close"] if daily is not None else pd.Series(dtype=float)
 
-        # Core validations
-        if pd.isna(close):
-            logging.warning(f"Close price is missing for {symbol}.")
+    def quote(self):
+        """
+        Quote dict in the get_price format, plus the daily close "history".
+        """
+        if self.daily is None:
+            return self._quote
+        quote = price_from_history(self.symbol, self.daily)
+        if quote:
+            quote["history"] = [float(c) for c in self.closes()]
+        return quote
+
+    def chart_bars(self, sessions=CHART_SESSIONS):
+        """
+        Intraday bars for the last `sessions` trading days, or None when
+        none were given.
+        """
+        if self.bars is None:
             return None
+        days = self.bars.index.normalize().unique()[-sessions:]
+        return self.bars[self.bars.index.normalize().isin(days)]
 
-        # Convert to float and handle missing values
-        price = float(close)
-        low = float(low) if not pd.isna(low) else None
-        high = float(high) if not pd.isna(high) else None
-        volume = int(volume) if not pd.isna(volume) else 0
 
-        # Average volume (safe)
-        vol_series = data["Volume"].dropna()
-        avg_volume = int(vol_series.mean()) if not vol_series.empty else 0
+def get_market_data(symbols, concurrent=True, timeout=PROBE_TIMEOUT, max_workers=PROBE_WORKERS, outcomes=None):
+    """
+    MarketData for the first candidate (in list order) that has data.
+    `outcomes` is filled as in get_price_concurrent.
+    """
+    symbols = symbols if isinstance(symbols, list) else [symbols]
+    if concurrent and len(symbols) > 1:
+        return get_price_concurrent(symbols, timeout=timeout, max_workers=max_workers, probe=MarketData.fetch,
+                                    outcomes=outcomes)
 
-        # Change percentage calculation
-        if open_ and not pd.isna(open_) and open_ > 0:
-            change_percent = round(((price - open_) / open_) * 100, 2)
-        else:
-            change_percent = 0.0
+    for sym in symbols:
+        data = MarketData.fetch(sym)
+        if outcomes is not None:
+            outcomes[sym] = bool(data)
+        if data:
+            return data
+    logging.error(f"No valid data found for any of the symbols: {symbols}")
+    return None
 
-        return {
-            "symbol": symbol,
-            "price": price,
-            "low": low,
-            "high": high,
-            "volume": volume,
-            "avg_volume": avg_volume,
-            "change_percent": change_percent,
-            "source": "yahoo"
-        }
+def get_price_from_yahoo(symbol):
+    try:
+        ticker = yf.Ticker(symbol)
+
+        # Fetch 5-day data (1-day interval)
+        data = ticker.history(period="5d", interval="1d")
+
+        return price_from_history(symbol, data)
 
     except Exception as e:
         logging.error(f"Error fetching data for {symbol} from Yahoo Finance: {str(e)}")
         return None
 
+def price_from_history(symbol, data, volume_window=5):
+    """
+    Build the quote dict from daily OHLCV bars (last bar is the current
+    session). Average volume is taken over the last `volume_window` bars.
+    Returns None when the bars carry no usable close.
+    """
+    if data is None or data.empty:
+        logging.warning(f"No data found for {symbol} from Yahoo Finance.")
+        return None
+
+    data = data.dropna(how="all")
+    if data.empty:
+        logging.warning(f"Data is empty for {symbol}.")
+        return None
+
+    last = data.iloc[-1]
+
+    close = last.get("Close")
+    open_ = last.get("Open")
+    low = last.get("Low")
+    high = last.get("High")
+    volume = last.get("Volume")
+
+    # Core validations
+    if pd.isna(close):
+        logging.warning(f"Close price is missing for {symbol}.")
+        return None
+
+    # Convert to float and handle missing values
+    price = float(close)
+    low = float(low) if not pd.isna(low) else None
+    high = float(high) if not pd.isna(high) else None
+    volume = int(volume) if not pd.isna(volume) else 0
+
+    # Average volume (safe)
+    vol_series = data["Volume"].tail(volume_window).dropna()
+    avg_volume = int(vol_series.mean()) if not vol_series.empty else 0
+
+    # Change percentage calculation
+    if open_ and not pd.isna(open_) and open_ > 0:
+        change_percent = round(((price - open_) / open_) * 100, 2)
+    else:
+        change_percent = 0.0
+
+    return {
+        "symbol": symbol,
+        "price": price,
+        "low": low,
+        "high": high,
+        "volume": volume,
+        "avg_volume": avg_volume,
+        "change_percent": change_percent,
+        "source": "yahoo"
+    }
+
+def download_history_bulk(symbols, period="3mo", interval="1d", chunk_size=100, failed=None):
+    """
+    OHLCV bars for many tickers through the local store: only stale series
+    are downloaded, with one bulk yf.download call per `chunk_size` tickers.
+    Returns {symbol: DataFrame} for every symbol that has data; `failed` is
+    as in ohlcv_store.get_bars_bulk.
+    """
+    return ohlcv_store.get_bars_bulk(symbols, interval=interval, period=period, chunk_size=chunk_size,
+                                     failed=failed)
+
 def get_price_from_alpha_vantage(symbol):
     try:
+        from alpha_vantage.timeseries import TimeSeries
+
         ts = TimeSeries(key=ALPHA_VANTAGE_API_KEY, output_format='pandas')
 
         # Fetch the quote data for the symbol
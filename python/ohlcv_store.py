@@ -0,0 +1,426 @@
+import os
+import re
+import json
+import time
+import logging
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from storage import cache_path, locked
+
+# ------------------- Local OHLCV Store -------------------
+# One append-only file of fixed-width bar records per symbol and interval,
+# read back through np.memmap. A refresh only downloads bars from the last
+# stored ones onwards, truncates the file at the first re-downloaded bar and
+# appends. The second-to-last stored bar is always re-downloaded too: if its
+# close changed, Yahoo re-adjusted history (split/dividend) and the whole
+# series is rebuilt.
+BAR_DTYPE = np.dtype([
+    ("ts", "<i8"),  # bar open time, UTC nanoseconds
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+])
+COLUMNS = {"Open": "open", "High": "high", "Low": "low", "Close": "close", "Volume": "volume"}
+
+# History requested when a series is first stored
+INITIAL_PERIOD = {"1m": "7d", "2m": "60d", "5m": "60d", "15m": "60d", "30m": "60d",
+                  "60m": "730d", "1h": "730d", "1d": "10y", "1wk": "max", "1mo": "max"}
+# Seconds before a stored series is considered stale; the daily series
+# carries the live quote (market.MarketData), so it goes stale quickly too
+REFRESH_AFTER = {"1m": 30, "2m": 60, "5m": 60, "15m": 120, "30m": 300,
+                 "60m": 600, "1h": 600, "1d": 120, "1wk": 3600, "1mo": 3600}
+# Oldest intraday bar Yahoo serves, in days; requests are clamped to it
+MAX_LOOKBACK_DAYS = {"1m": 29, "2m": 59, "5m": 59, "15m": 59, "30m": 59, "60m": 729, "1h": 729}
+ADJUSTMENT_TOLERANCE = 1e-3
+
+# Exchange timezone by ticker suffix, used when bars arrive without one (bulk downloads)
+SUFFIX_TZ = {".NS": "Asia/Kolkata", ".BO": "Asia/Kolkata", "-USD": "UTC", "-USDT": "UTC", "-BTC": "UTC"}
+DEFAULT_TZ = "America/New_York"
+
+
+def _paths(symbol, interval):
+    safe = re.sub(r"[^A-Za-z0-9._-]", "_", symbol.upper())
+    base = cache_path("ohlcv", interval, safe)
+    return base + ".bin", base + ".json", base + ".lock"
+
+
+def _read_records(bin_path):
+    if not os.path.exists(bin_path):
+        return np.empty(0, dtype=BAR_DTYPE)
+    count = os.path.getsize(bin_path) // BAR_DTYPE.itemsize
+    if count == 0:
+        return np.empty(0, dtype=BAR_DTYPE)
+    return np.memmap(bin_path, dtype=BAR_DTYPE, mode="r", shape=(count,))
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(meta_path, meta):
+    tmp = meta_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path)
+
+
+def _guess_tz(symbol):
+    for suffix, tz in SUFFIX_TZ.items():
+        if symbol.upper().endswith(suffix):
+            return tz
+    return DEFAULT_TZ
+
+
+def _to_records(frame):
+    """
+    OHLCV DataFrame -> sorted, de-duplicated record array.
+    """
+    frame = frame[[c for c in COLUMNS if c in frame.columns]].dropna(subset=["Close"])
+    index = frame.index
+    if index.tz is None:
+        index = index.tz_localize("UTC")
+    records = np.empty(len(frame), dtype=BAR_DTYPE)
+    records["ts"] = index.tz_convert("UTC").as_unit("ns").asi8
+    for column, field in COLUMNS.items():
+        records[field] = frame[column].to_numpy(dtype="f8") if column in frame.columns else np.nan
+    records = records[np.argsort(records["ts"], kind="stable")]
+    keep = np.ones(len(records), dtype=bool)
+    keep[:-1] = records["ts"][1:] != records["ts"][:-1]  # last duplicate wins
+    return records[keep]
+
+
+def _to_frame(records, tz):
+    index = pd.DatetimeIndex(pd.to_datetime(records["ts"], utc=True)).tz_convert(tz or "UTC")
+    return pd.DataFrame({column: records[field] for column, field in COLUMNS.items()}, index=index)
+
+
+def _write(bin_path, keep, records):
+    """
+    Keep the first `keep` stored records and append `records` after them.
+    """
+    mode = "r+b" if os.path.exists(bin_path) else "wb"
+    with open(bin_path, mode) as f:
+        f.truncate(keep * BAR_DTYPE.itemsize)
+        f.seek(keep * BAR_DTYPE.itemsize)
+        f.write(records.tobytes())
+
+
+def _download(symbol, interval, start=None, period=None):
+    ticker = yf.Ticker(symbol)
+    if start is not None:
+        frame = ticker.history(start=start, interval=interval, auto_adjust=True)
+    else:
+        frame = ticker.history(period=period or INITIAL_PERIOD.get(interval, "max"), interval=interval, auto_adjust=True)
+    if frame is None or frame.empty or "Close" not in frame.columns:
+        return pd.DataFrame()
+    return frame.dropna(subset=["Close"])
+
+
+def _anchor(stored):
+    """
+    Index of the stored bar every delta download starts from.
+    """
+    return max(0, len(stored) - 2)
+
+
+def _merge(symbol, interval, fresh):
+    """
+    Merge downloaded bars into the store. Must hold the exclusive lock.
+    Returns False when the stored series has to be rebuilt instead.
+    """
+    bin_path, meta_path, _ = _paths(symbol, interval)
+    stored = _read_records(bin_path)
+    meta = _read_meta(meta_path)
+    records = _to_records(fresh)
+    if len(records) == 0:
+        return True
+
+    keep = 0
+    if len(stored):
+        first = records["ts"][0]
+        if first > stored["ts"][-1]:
+            # Gap after the stored bars: start over
+            return False
+        anchor = stored[_anchor(stored)]
+        same = records[records["ts"] == anchor["ts"]]
+        if len(same) and anchor["close"]:
+            drift = abs(same["close"][0] - anchor["close"]) / abs(anchor["close"])
+            if drift > ADJUSTMENT_TOLERANCE:
+                return False
+        keep = int(np.searchsorted(stored["ts"], first, side="left"))
+        del stored
+
+    _write(bin_path, keep, records)
+    tz = fresh.index.tz
+    meta["tz"] = str(tz) if tz is not None and str(tz) != "UTC" else meta.get("tz") or _guess_tz(symbol)
+    meta["refreshed_at"] = time.time()
+    _write_meta(meta_path, meta)
+    return True
+
+
+def _utc_ns(ts):
+    ts = pd.Timestamp(ts)
+    ts = ts.tz_localize("UTC") if ts.tz is None else ts.tz_convert("UTC")
+    return ts.as_unit("ns").value
+
+
+def _covered_from(stored, meta):
+    """
+    Earliest time the stored series is known to cover: its first bar, or an
+    earlier requested start when the symbol simply has no older history.
+    """
+    first = int(stored["ts"][0]) if len(stored) else None
+    covered = meta.get("covered_from")
+    if first is None:
+        return covered
+    return first if covered is None else min(first, covered)
+
+
+def _earliest(interval):
+    """
+    Earliest start Yahoo accepts for `interval`, or None when unlimited.
+    """
+    days = MAX_LOOKBACK_DAYS.get(interval)
+    return pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=days) if days else None
+
+
+def _clamp_start(interval, start):
+    earliest = _earliest(interval)
+    if start is None or earliest is None:
+        return start
+    return max(pd.Timestamp(_utc_ns(start), tz="UTC"), earliest)
+
+
+def _is_backfill(stored, meta, start):
+    if start is None:
+        return False
+    covered = _covered_from(stored, meta)
+    # Allow a few days of slack for weekends and holidays at the series start
+    return covered is None or _utc_ns(start) < covered - 5 * 86400 * 10**9
+
+
+def _needs_refresh(symbol, interval, start=None, lock=True):
+    """
+    True when the stored series is missing, stale or does not reach back to
+    `start`. Reads under the shared lock unless the caller already holds
+    the exclusive one (`lock=False`).
+    """
+    bin_path, meta_path, lock_path = _paths(symbol, interval)
+    meta = _read_meta(meta_path)
+    if not os.path.exists(bin_path) or not meta:
+        return True
+    start = _clamp_start(interval, start)
+    if start is not None:
+        if lock:
+            with locked(lock_path, exclusive=False):
+                backfill = _is_backfill(_read_records(bin_path), meta, start)
+        else:
+            backfill = _is_backfill(_read_records(bin_path), meta, start)
+        if backfill:
+            return True
+    return time.time() - meta.get("refreshed_at", 0) > REFRESH_AFTER.get(interval, 900)
+
+
+def refresh(symbol, interval="1d", start=None):
+    """
+    Bring the stored series up to date, downloading only the missing bars.
+    Backfills (`start` earlier than the stored history) rebuild the series.
+    """
+    bin_path, meta_path, lock_path = _paths(symbol, interval)
+    start = _clamp_start(interval, start)
+    earliest = _earliest(interval)
+    with locked(lock_path, exclusive=True):
+        if not _needs_refresh(symbol, interval, start, lock=False):
+            return  # another process refreshed it while we waited
+
+        stored = _read_records(bin_path)
+        meta = _read_meta(meta_path)
+        if len(stored) and not _is_backfill(stored, meta, start):
+            anchor = pd.Timestamp(int(stored["ts"][_anchor(stored)]), tz="UTC")
+            del stored
+            # An anchor beyond Yahoo's intraday lookback cannot be bridged
+            if earliest is None or anchor >= earliest:
+                try:
+                    # The delta always includes the anchor bar, so an empty
+                    # answer is a failed delta, not "nothing new"
+                    fresh = _download(symbol, interval, start=anchor)
+                    if not fresh.empty and _merge(symbol, interval, fresh):
+                        return
+                except Exception as e:
+                    logging.warning(f"Incremental refresh failed for {symbol} {interval}: {e}")
+        else:
+            del stored
+
+        # Cold start, backfill, re-adjusted history or failed delta
+        # Rebuilds keep whatever range the series already covered, as far
+        # back as Yahoo still serves the interval
+        covered = _covered_from(_read_records(bin_path), meta)
+        if covered is not None:
+            start_ns = covered if start is None else min(covered, _utc_ns(start))
+            start = _clamp_start(interval, pd.Timestamp(start_ns, tz="UTC"))
+        fresh = _download(symbol, interval, start=start)
+        if fresh.empty:
+            if meta:
+                # Nothing to download in the allowed range: keep the series
+                # and wait for the next refresh interval instead of retrying
+                meta["refreshed_at"] = time.time()
+                _write_meta(meta_path, meta)
+            return
+        if os.path.exists(bin_path):
+            _write(bin_path, 0, np.empty(0, dtype=BAR_DTYPE))
+        _merge(symbol, interval, fresh)
+
+        meta = _read_meta(meta_path)
+        requested = _utc_ns(start) if start is not None else _period_start(INITIAL_PERIOD.get(interval, "max"))
+        meta["covered_from"] = requested.value if isinstance(requested, pd.Timestamp) else (requested or 0)
+        _write_meta(meta_path, meta)
+
+
+def _period_start(period):
+    match = re.fullmatch(r"(\d+)(d|wk|mo|y)", period or "")
+    if not match:
+        return None
+    count, unit = int(match.group(1)), match.group(2)
+    days = {"d": 1, "wk": 7, "mo": 31, "y": 366}[unit] * count
+    return pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=days)
+
+
+def read_bars(symbol, interval="1d", period=None, start=None, end=None):
+    """
+    Stored bars only, no network. Same slicing rules as get_bars.
+    """
+    bin_path, meta_path, lock_path = _paths(symbol, interval)
+    if not os.path.exists(bin_path):
+        return pd.DataFrame()
+
+    if start is None and period:
+        start = _period_start(period)
+
+    with locked(lock_path, exclusive=False):
+        stored = _read_records(bin_path)
+        lo, hi = 0, len(stored)
+        if start is not None:
+            lo = int(np.searchsorted(stored["ts"], _utc_ns(start), side="left"))
+        if end is not None:
+            hi = int(np.searchsorted(stored["ts"], _utc_ns(end), side="left"))
+        records = np.array(stored[lo:hi])  # copy out of the memmap before unlocking
+        del stored
+
+    if not len(records):
+        return pd.DataFrame()
+    return _to_frame(records, _read_meta(meta_path).get("tz"))
+
+
+def get_bars(symbol, interval="1d", period=None, start=None, end=None, refresh_data=True):
+    """
+    OHLCV bars for one symbol from the local store, refreshing it first when
+    stale. Slice with `period` ("60d", "6mo", "10y", ...) or `start`/`end`
+    (end exclusive). Returns an empty DataFrame when nothing is available.
+    A cold series is downloaded from `start` (or `period` back) only, not
+    the full INITIAL_PERIOD; a later, longer request backfills it.
+    """
+    fetch_start = start if start is not None else _period_start(period)
+    if refresh_data and _needs_refresh(symbol, interval, fetch_start):
+        try:
+            refresh(symbol, interval, start=fetch_start)
+        except Exception as e:
+            logging.error(f"OHLCV refresh failed for {symbol} {interval}: {e}")
+    return read_bars(symbol, interval, period=period, start=start, end=end)
+
+
+def _bulk_download(symbols, interval, start=None, period=None):
+    kwargs = {"start": start} if start is not None else {"period": period or INITIAL_PERIOD.get(interval, "max")}
+    data = yf.download(symbols, interval=interval, group_by="ticker", auto_adjust=True,
+                       ignore_tz=False, threads=True, progress=False, **kwargs)
+    frames = {}
+    if data is None or data.empty:
+        return frames
+    for sym in symbols:
+        if isinstance(data.columns, pd.MultiIndex):
+            if sym not in data.columns.get_level_values(0):
+                continue
+            frame = data[sym]
+        elif len(symbols) == 1:
+            frame = data
+        else:
+            continue
+        frame = frame.dropna(how="all")
+        if not frame.empty and "Close" in frame.columns and frame["Close"].notna().any():
+            frames[sym] = frame
+    return frames
+
+
+def get_bars_bulk(symbols, interval="1d", period=None, chunk_size=100, failed=None):
+    """
+    Bars for many symbols. Stale stored series are brought up to date with
+    one bulk delta download per chunk, unseen symbols with one bulk full
+    download per chunk. Returns {symbol: DataFrame} for symbols with data.
+    If `failed` is a set it receives the symbols whose chunk download
+    raised or came back empty for every symbol, i.e. whose missing data may
+    be an outage rather than an unknown ticker.
+    """
+    symbols = list(dict.fromkeys(symbols))
+    stale = [s for s in symbols if _needs_refresh(s, interval)]
+    anchors = {}
+    earliest = _earliest(interval)
+    for sym in stale:
+        bin_path, _, lock_path = _paths(sym, interval)
+        with locked(lock_path, exclusive=False):
+            stored = _read_records(bin_path)
+            if len(stored):
+                anchors[sym] = int(stored["ts"][_anchor(stored)])
+            del stored
+    # Series whose anchor is past the intraday lookback are rebuilt one by one
+    expired = [s for s in anchors if earliest is not None and anchors[s] < earliest.value]
+    for sym in expired:
+        del anchors[sym]
+        refresh(sym, interval)
+    cold = [s for s in stale if s not in anchors and s not in expired]
+    warm = [s for s in stale if s in anchors]
+
+    for group, incremental in ((cold, False), (warm, True)):
+        for i in range(0, len(group), chunk_size):
+            chunk = group[i:i + chunk_size]
+            start = pd.Timestamp(min(anchors[s] for s in chunk), tz="UTC") if incremental else None
+            try:
+                frames = _bulk_download(chunk, interval, start=start, period=None if incremental else period)
+            except Exception as e:
+                logging.error(f"Bulk download failed for {len(chunk)} symbols: {e}")
+                frames = {}
+            if not frames and failed is not None:
+                failed.update(chunk)
+            requested = None if incremental else _period_start(period or INITIAL_PERIOD.get(interval, "max"))
+            for sym in chunk:
+                _, meta_path, lock_path = _paths(sym, interval)
+                frame = frames.get(sym)
+                with locked(lock_path, exclusive=True):
+                    if frame is None:
+                        if incremental:
+                            # No delta: keep the series and wait for the next
+                            # refresh interval, as refresh() does
+                            meta = _read_meta(meta_path)
+                            meta["refreshed_at"] = time.time()
+                            _write_meta(meta_path, meta)
+                        continue
+                    merged = _merge(sym, interval, frame)
+                    if merged and not incremental:
+                        # Record the requested range, as refresh() does
+                        meta = _read_meta(meta_path)
+                        meta["covered_from"] = requested.value if requested is not None else 0
+                        _write_meta(meta_path, meta)
+                if not merged:
+                    refresh(sym, interval)  # history was re-adjusted: rebuild this one alone
+
+    bars = {}
+    for sym in symbols:
+        frame = read_bars(sym, interval, period=period)
+        if not frame.empty:
+            bars[sym] = frame
+    return bars
@@ -1,5 +1,6 @@
 import re
-from twitter import fetch_tweets, aggregate_sentiment
+from twitter import fetch_tweets
+import sentiment_state
 
 def base_symbol(symbol: str) -> str:
     """
@@ -37,7 +38,8 @@ def sentiment_for_symbol(symbol: str) -> dict:
                 "bullish_ratio": 0.5
             }
 
-        sentiment = aggregate_sentiment(tweets)
+        # Time-decayed, folding in only tweets not scored before
+        sentiment = sentiment_state.update(symbol, tweets)
         print(f"Aggregated sentiment for {clean_symbol}: {sentiment}")
 
         bias = sentiment.get("bias", "neutral")
@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import logging
+from datetime import datetime
+from storage import connect
+import tweet_store
+import tweet_dedup
+
+# ------------------- Incremental Sentiment -------------------
+# Running, exponentially time-decayed sums of positive / negative / neutral
+# tweet weight per symbol, plus each tweet's score. A refresh scores only the
+# tweets newer than the last one folded in, decays the stored sums to now
+# and adds the new weights, so its cost follows the number of new tweets and
+# not the size of the window. A tweet's weight halves every HALF_LIFE seconds.
+# Engagement of stored tweets is refreshed with every tweet search
+# (tweet_store.update_metrics); only after such a refresh are the tweets
+# already folded in re-weighed, by the difference to the weight kept in
+# tweet_scores. The stored scores also let a change of HALF_LIFE re-fold the
+# sums without re-scoring; a change of scorer starts the symbol over.
+HALF_LIFE = float(os.getenv("SENTIMENT_HALF_LIFE", 6 * 3600))
+# Decayed directional weight below which the answer is "no data". 0 (the
+# default) keeps the plain aggregate_sentiment rule that any directional
+# tweet counts, however old; a positive floor hides windows whose tweets
+# have all decayed away, e.g. 0.5 is half of one fresh plain tweet.
+MIN_WEIGHT = float(os.getenv("SENTIMENT_MIN_WEIGHT", 0))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sentiment_state (
+    symbol TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tweet_scores (
+    symbol TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    score REAL NOT NULL,
+    weight REAL NOT NULL,
+    ts REAL NOT NULL,
+    PRIMARY KEY (symbol, id)
+);
+"""
+
+EMPTY_STATE = {"pos": 0.0, "neg": 0.0, "neu": 0.0, "as_of": 0.0, "last_id": 0, "count": 0}
+
+
+def _db():
+    return connect("sentiment", SCHEMA)
+
+
+def tweet_time(tweet):
+    """
+    Unix time a tweet was posted: created_at, else the time in its id.
+    """
+    created_at = tweet.get("created_at")
+    if created_at:
+        try:
+            return datetime.fromisoformat(created_at.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    if tweet.get("id"):
+        return tweet_store.id_time(tweet["id"])
+    return time.time()
+
+
+def decay(state, now, half_life):
+    """
+    The sums in `state` as of `now`.
+    """
+    factor = 0.5 ** (max(0.0, now - state["as_of"]) / half_life)
+    return {**state, "pos": state["pos"] * factor, "neg": state["neg"] * factor,
+            "neu": state["neu"] * factor, "as_of": now}
+
+
+def fold(state, scored, now, half_life, count=True):
+    """
+    Decay `state` to `now` and add (label, weight, ts) tweets. With
+    count=False the weights are corrections to tweets already counted.
+    """
+    state = decay(state, now, half_life)
+    for label, weight, ts in scored:
+        decayed = weight * 0.5 ** (max(0.0, now - ts) / half_life)
+        key = {"positive": "pos", "negative": "neg"}.get(label, "neu")
+        state[key] = max(0.0, state[key] + decayed)
+        if count:
+            state["count"] += 1
+    return state
+
+
+def _reweigh(db, key, tweets, last_id):
+    """
+    (id, label, weight change, ts) for tweets folded in before whose
+    engagement weight has changed.
+    """
+    from twitter import tweet_weight
+
+    current = {int(t["id"]): tweet_weight(t) for t in tweets if int(t["id"]) <= last_id}
+    if not current:
+        return []
+    placeholders = ",".join("?" * len(current))
+    rows = db.execute(
+        f"SELECT id, label, weight, ts FROM tweet_scores WHERE symbol = ? AND id IN ({placeholders})",
+        (key, *current)
+    ).fetchall()
+    return [(i, label, current[i] - weight, ts) for i, label, weight, ts in rows if abs(current[i] - weight) > 1e-9]
+
+
+def _refold(db, key, state, now, half_life):
+    """
+    The sums rebuilt from the stored tweet scores with a new half-life.
+    """
+    rows = db.execute("SELECT label, weight, ts FROM tweet_scores WHERE symbol = ?", (key,)).fetchall()
+    return fold({**EMPTY_STATE, "last_id": state["last_id"]}, rows, now, half_life)
+
+
+def summarize(state):
+    """
+    bias / confidence / bullish_ratio from decayed sums, through
+    twitter.sentiment_summary.
+    """
+    from twitter import sentiment_summary
+
+    if MIN_WEIGHT and state["pos"] + state["neg"] < MIN_WEIGHT:
+        return sentiment_summary(0.0, 0.0)
+    return sentiment_summary(state["pos"], state["neg"])
+
+
+def load(symbol):
+    try:
+        row = _db().execute("SELECT state FROM sentiment_state WHERE symbol = ?", (symbol.upper(),)).fetchone()
+        return json.loads(row[0]) if row else dict(EMPTY_STATE)
+    except Exception as e:
+        logging.warning(f"Sentiment state read failed: {e}")
+        return dict(EMPTY_STATE)
+
+
+def update(symbol, tweets, half_life=None, now=None, scorer=None):
+    """
+    Fold the tweets of `tweets` not seen before into the symbol's decayed
+    sums and return the bias / confidence / bullish_ratio summary. `scorer`
+    is "vader" or "transformer" (twitter.SENTIMENT_SCORER by default).
+    """
+    from twitter import analyze_sentiment_batch, tweet_weight, _resolve_scorer
+
+    half_life = half_life or HALF_LIFE
+    now = now if now is not None else time.time()
+    scorer = _resolve_scorer(scorer)
+    key = symbol.upper()
+    stored = load(key)
+    # Labels from another scorer are not reused: everything is scored again
+    last_id = int(stored["last_id"]) if stored.get("scorer", scorer) == scorer else 0
+
+    # Near-duplicates are collapsed over the whole window, oldest first, so a
+    # new copy of a tweet folded in earlier joins that tweet's cluster and is
+    # not counted again
+    tweets = sorted((t for t in tweets if t.get("id")), key=lambda t: int(t["id"]))
+    tweets = tweet_dedup.collapse(tweets)
+
+    # Score outside the write transaction; ids at or below last_id are done
+    fresh = [t for t in tweets if int(t["id"]) > last_id]
+    scores = analyze_sentiment_batch([t.get("text", "") for t in fresh], scorer)
+    scored = [
+        (int(t["id"]), label, score, tweet_weight(t), tweet_time(t))
+        for t, (label, score) in zip(fresh, scores)
+    ]
+
+    try:
+        db = _db()
+        db.execute("BEGIN IMMEDIATE")
+        row = db.execute("SELECT state FROM sentiment_state WHERE symbol = ?", (key,)).fetchone()
+        state = json.loads(row[0]) if row else dict(EMPTY_STATE)
+        if state.get("scorer", scorer) != scorer:
+            state = dict(EMPTY_STATE)
+            db.execute("DELETE FROM tweet_scores WHERE symbol = ?", (key,))
+        elif state.get("half_life", half_life) != half_life:
+            state = _refold(db, key, state, now, half_life)
+        state["scorer"], state["half_life"] = scorer, half_life
+        # Engagement of folded tweets only changes with a metrics refresh
+        changed = []
+        metrics_at = tweet_store.metrics_refreshed_at(key)
+        if metrics_at > state.get("reweighed_at", 0.0):
+            changed = _reweigh(db, key, tweets, int(state["last_id"]))
+            state["reweighed_at"] = metrics_at
+        # Another process may have folded some of these in meanwhile
+        scored = [s for s in scored if s[0] > int(state["last_id"])]
+        state = fold(state, [(label, weight, ts) for _, label, _, weight, ts in scored], now, half_life)
+        state = fold(state, [(label, delta, ts) for _, label, delta, ts in changed], now, half_life, count=False)
+        if scored:
+            state["last_id"] = max(s[0] for s in scored)
+        db.executemany(
+            "INSERT OR REPLACE INTO tweet_scores (symbol, id, label, score, weight, ts) VALUES (?, ?, ?, ?, ?, ?)",
+            [(key, *s) for s in scored]
+        )
+        db.executemany(
+            "UPDATE tweet_scores SET weight = weight + ? WHERE symbol = ? AND id = ?",
+            [(delta, key, i) for i, _, delta, _ in changed]
+        )
+        db.execute("DELETE FROM tweet_scores WHERE symbol = ? AND ts < ?", (key, now - tweet_store.MAX_AGE))
+        db.execute("INSERT OR REPLACE INTO sentiment_state (symbol, state) VALUES (?, ?)", (key, json.dumps(state)))
+        db.execute("COMMIT")
+    except Exception as e:
+        logging.warning(f"Sentiment state write failed: {e}")
+        try:
+            db.execute("ROLLBACK")
+        except Exception:
+            pass
+        # Still answer from what we have, decayed to now
+        state = fold(load(key), [(label, weight, ts) for _, label, _, weight, ts in scored], now, half_life)
+
+    return summarize(state)
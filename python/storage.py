@@ -0,0 +1,63 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # no cross-process locking on Windows dev boxes
+    fcntl = None
+
+# ------------------- Local Cache Storage -------------------
+# Every persistent engine cache lives under one directory so that all worker
+# processes on a host share it. Override with ENGINE_CACHE_DIR.
+CACHE_DIR = os.getenv(
+    "ENGINE_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+)
+
+_local = threading.local()
+
+def cache_path(*parts):
+    """
+    Absolute path inside the cache directory, creating parent folders.
+    """
+    path = os.path.join(CACHE_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def connect(name, schema=""):
+    """
+    Return this thread's SQLite connection to `<CACHE_DIR>/<name>.sqlite`.
+    WAL mode lets many engine processes read while one writes; `schema` is
+    executed once per connection and should be idempotent.
+    """
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(name)
+    if conn is None:
+        conn = sqlite3.connect(cache_path(f"{name}.sqlite"), timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if schema:
+            conn.executescript(schema)
+        connections[name] = conn
+    return conn
+
+
+@contextmanager
+def locked(lock_path, exclusive=True):
+    """
+    Hold an flock on `lock_path` (shared or exclusive) across processes.
+    """
+    with open(lock_path, "a") as handle:
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(handle, fcntl.LOCK_UN)
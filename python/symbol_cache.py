@@ -0,0 +1,168 @@
+import os
+import re
+import time
+import json
+import logging
+from storage import connect
+
+# ------------------- Symbol Resolution Cache -------------------
+# Persists what we learn while resolving user text to a ticker:
+#   queries   raw text      -> ticker that returned data
+#   searches  candidate     -> Yahoo search result (NULL = negative entry)
+#   probes    ticker        -> last probe outcome (failures are skipped)
+#   suffixes  suffix        -> success / failure counts used to rank variants
+RESOLVED_TTL = int(os.getenv("SYMBOL_CACHE_TTL", 7 * 24 * 3600))
+NEGATIVE_TTL = int(os.getenv("SYMBOL_CACHE_NEGATIVE_TTL", 24 * 3600))
+# Failures that may be an outage (errors, timeouts) are only skipped briefly
+TRANSIENT_TTL = int(os.getenv("SYMBOL_CACHE_TRANSIENT_TTL", 600))
+SUFFIX_PRIOR = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queries (key TEXT PRIMARY KEY, ticker TEXT NOT NULL, expires_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS searches (key TEXT PRIMARY KEY, result TEXT, expires_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS probes (ticker TEXT PRIMARY KEY, ok INTEGER NOT NULL, expires_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS suffixes (suffix TEXT PRIMARY KEY, successes INTEGER NOT NULL DEFAULT 0, failures INTEGER NOT NULL DEFAULT 0);
+"""
+
+MISSING = object()
+
+def _db():
+    return connect("symbols", SCHEMA)
+
+
+def _query_key(text):
+    return re.sub(r"\s+", " ", (text or "").strip().lower())
+
+
+def suffix_of(ticker):
+    match = re.search(r"([.-][A-Z]+)$", ticker.upper())
+    return match.group(1) if match else ""
+
+# ------------------- Raw text -> ticker -------------------
+def get_resolved(text):
+    """
+    Ticker previously resolved for this raw user text, or None.
+    """
+    try:
+        row = _db().execute(
+            "SELECT ticker FROM queries WHERE key = ? AND expires_at > ?",
+            (_query_key(text), time.time())
+        ).fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        logging.warning(f"Symbol cache read failed: {e}")
+        return None
+
+
+def set_resolved(text, ticker, ttl=RESOLVED_TTL):
+    try:
+        _db().execute(
+            "INSERT OR REPLACE INTO queries (key, ticker, expires_at) VALUES (?, ?, ?)",
+            (_query_key(text), ticker, time.time() + ttl)
+        )
+    except Exception as e:
+        logging.warning(f"Symbol cache write failed: {e}")
+
+
+def forget_resolved(text):
+    try:
+        _db().execute("DELETE FROM queries WHERE key = ?", (_query_key(text),))
+    except Exception as e:
+        logging.warning(f"Symbol cache write failed: {e}")
+
+# ------------------- Candidate -> Yahoo search -------------------
+def get_search(candidate):
+    """
+    Cached Yahoo search result for a candidate. Returns MISSING on a cache
+    miss and None for a cached negative result.
+    """
+    try:
+        row = _db().execute(
+            "SELECT result FROM searches WHERE key = ? AND expires_at > ?",
+            (candidate.upper(), time.time())
+        ).fetchone()
+    except Exception as e:
+        logging.warning(f"Symbol cache read failed: {e}")
+        return MISSING
+    if not row:
+        return MISSING
+    return json.loads(row[0]) if row[0] is not None else None
+
+
+def set_search(candidate, result):
+    ttl = RESOLVED_TTL if result else NEGATIVE_TTL
+    try:
+        _db().execute(
+            "INSERT OR REPLACE INTO searches (key, result, expires_at) VALUES (?, ?, ?)",
+            (candidate.upper(), json.dumps(result) if result else None, time.time() + ttl)
+        )
+    except Exception as e:
+        logging.warning(f"Symbol cache write failed: {e}")
+
+# ------------------- Ticker probes -------------------
+def record_probe(ticker, ok, transient=False):
+    """
+    Remember whether a ticker returned price data and update the suffix
+    statistics used by rank_candidates. A `transient` failure (the request
+    itself failed) is remembered for TRANSIENT_TTL only and is left out of
+    the suffix statistics.
+    """
+    ttl = RESOLVED_TTL if ok else TRANSIENT_TTL if transient else NEGATIVE_TTL
+    column = "successes" if ok else "failures"
+    try:
+        db = _db()
+        db.execute(
+            "INSERT OR REPLACE INTO probes (ticker, ok, expires_at) VALUES (?, ?, ?)",
+            (ticker.upper(), 1 if ok else 0, time.time() + ttl)
+        )
+        if transient and not ok:
+            return
+        db.execute(
+            f"INSERT INTO suffixes (suffix, {column}) VALUES (?, 1) "
+            f"ON CONFLICT(suffix) DO UPDATE SET {column} = {column} + 1",
+            (suffix_of(ticker),)
+        )
+    except Exception as e:
+        logging.warning(f"Symbol cache write failed: {e}")
+
+
+def rank_candidates(candidates):
+    """
+    Reorder normalized candidates: tickers with a live negative entry are
+    dropped, the rest are sorted by their suffix's historical success rate,
+    keeping the original priority order as the tie-break. If every
+    candidate is negatively cached the list is returned unchanged.
+    """
+    if len(candidates) < 2:
+        return candidates
+
+    try:
+        db = _db()
+        now = time.time()
+        placeholders = ",".join("?" * len(candidates))
+        failed = {
+            row[0] for row in db.execute(
+                f"SELECT ticker FROM probes WHERE ok = 0 AND expires_at > ? AND ticker IN ({placeholders})",
+                (now, *[c.upper() for c in candidates])
+            )
+        }
+        stats = {
+            row[0]: (row[1], row[2]) for row in db.execute(
+                "SELECT suffix, successes, failures FROM suffixes"
+            )
+        }
+    except Exception as e:
+        logging.warning(f"Symbol cache read failed: {e}")
+        return candidates
+
+    remaining = [c for c in candidates if c.upper() not in failed]
+    if not remaining:
+        return candidates
+
+    def success_rate(ticker):
+        successes, failures = stats.get(suffix_of(ticker), (0, 0))
+        # Smoothed towards 0.5 so a handful of probes cannot reorder variants
+        return (successes + SUFFIX_PRIOR / 2) / (successes + failures + SUFFIX_PRIOR)
+
+    order = {c: i for i, c in enumerate(candidates)}
+    return sorted(remaining, key=lambda c: (-success_rate(c), order[c]))
@@ -0,0 +1,131 @@
+import os
+import re
+import zlib
+import numpy as np
+
+# ------------------- Near-Duplicate Tweets -------------------
+# Copy-pasted spam (the same text with a different link or mention, or a
+# few words changed) is collapsed before scoring, so each campaign counts
+# once. Tweets are compared by MinHash signatures of their word shingles
+# and bucketed with LSH banding; one pass over the tweets, a constant
+# number of bucket lookups each. A tweet joins the first cluster whose
+# representative's signature agrees on at least THRESHOLD of its hashes
+# (estimated Jaccard similarity), otherwise it starts a new cluster. Emoji
+# and cashtags are tokens like words; texts shorter than SHINGLE tokens
+# only cluster with an identical normalized text, and texts with no tokens
+# at all never do.
+ENABLED = os.getenv("TWEET_DEDUP", "1") != "0"
+THRESHOLD = float(os.getenv("TWEET_DEDUP_THRESHOLD", 0.7))
+NUM_PERM = 64
+BANDS = 16  # 4 rows per band: pairs above ~0.5 similarity usually share a bucket
+SHINGLE = 3
+BLOCK = 1024  # texts hashed per vectorized step, bounds memory
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 1 << 32, size=(NUM_PERM, 1), dtype=np.uint64)
+_B = _rng.randint(0, 1 << 32, size=(NUM_PERM, 1), dtype=np.uint64)
+
+_NOISE = re.compile(r"https?://\S+|www\.\S+|@\w+")
+_TOKEN = re.compile(r"\$\w+|\w+|[^\w\s]")
+
+
+def normalize(text):
+    """
+    Lowercase words, cashtags and emoji (one token per symbol) without
+    links, mentions and ASCII punctuation.
+    """
+    tokens = _TOKEN.findall(_NOISE.sub(" ", (text or "").lower()))
+    return [t for t in tokens if t[0] == "$" or t[0].isalnum() or t[0] == "_" or ord(t[0]) > 127]
+
+
+def shingles(words):
+    if len(words) <= SHINGLE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE]) for i in range(len(words) - SHINGLE + 1)}
+
+
+def _signature_block(token_lists):
+    hashes, offsets = [], []
+    for words in token_lists:
+        offsets.append(len(hashes))
+        hashes.extend(zlib.crc32(s.encode("utf-8")) for s in shingles(words))
+    values = np.asarray(hashes, dtype=np.uint64)
+    # Universal hashes (a * x + b) mod p, one row per permutation
+    permuted = (_A * values + _B) % _MERSENNE
+    return np.minimum.reduceat(permuted, offsets, axis=1).T
+
+
+def _signatures(token_lists):
+    if not token_lists:
+        return np.empty((0, NUM_PERM), dtype=np.uint64)
+    return np.concatenate([_signature_block(token_lists[i:i + BLOCK]) for i in range(0, len(token_lists), BLOCK)])
+
+
+def signatures(texts):
+    """
+    len(texts) x NUM_PERM MinHash matrix, computed BLOCK texts at a time.
+    """
+    return _signatures([normalize(text) for text in texts])
+
+
+def cluster(texts, threshold=None):
+    """
+    Cluster id (the index of its first member) for every text.
+    """
+    threshold = THRESHOLD if threshold is None else threshold
+    rows = NUM_PERM // BANDS
+    words = [normalize(text) for text in texts]
+
+    # Too short to shingle: exact matches only
+    labels = list(range(len(texts)))
+    exact = {}
+    for i, tokens in enumerate(words):
+        if tokens and len(tokens) < SHINGLE:
+            labels[i] = exact.setdefault(" ".join(tokens), i)
+
+    indexed = [i for i, tokens in enumerate(words) if len(tokens) >= SHINGLE]
+    sigs = _signatures([words[i] for i in indexed])
+    buckets = {}
+    for pos, sig in enumerate(sigs):
+        keys = [(band, sig[band * rows:(band + 1) * rows].tobytes()) for band in range(BANDS)]
+        label = pos
+        seen = set()
+        for key in keys:
+            candidate = buckets.get(key)
+            if candidate is None or candidate in seen:
+                continue
+            seen.add(candidate)
+            if np.count_nonzero(sigs[candidate] == sig) >= threshold * NUM_PERM:
+                label = candidate
+                break
+        if label == pos:
+            # Only representatives are indexed, so clusters cannot drift
+            for key in keys:
+                buckets.setdefault(key, pos)
+        labels[indexed[pos]] = indexed[label]
+    return labels
+
+
+def collapse(tweets, threshold=None):
+    """
+    One tweet per near-duplicate cluster, in input order: the first member,
+    carrying the cluster's summed likes and retweets and its size as
+    "duplicates". Plain strings are kept as dicts with a "text" key.
+    """
+    tweets = [t if isinstance(t, dict) else {"text": t} for t in tweets]
+    if not ENABLED or len(tweets) < 2:
+        return tweets
+
+    labels = cluster([t.get("text", "") for t in tweets], threshold)
+    merged = {}
+    for tweet, label in zip(tweets, labels):
+        if label not in merged:
+            merged[label] = {**tweet, "likes": tweet.get("likes", 0), "retweets": tweet.get("retweets", 0),
+                             "duplicates": 1}
+        else:
+            rep = merged[label]
+            rep["likes"] += tweet.get("likes", 0)
+            rep["retweets"] += tweet.get("retweets", 0)
+            rep["duplicates"] += 1
+    return list(merged.values())
@@ -0,0 +1,187 @@
+import os
+import time
+import logging
+from storage import connect, cache_path, locked
+
+# ------------------- Tweet Store -------------------
+# Tweets per symbol shared by every process through SQLite, so the Twitter
+# API is searched at most once per symbol every REFRESH_INTERVAL seconds:
+#   tweets   rolling window of the newest WINDOW_SIZE tweets per symbol,
+#            none older than MAX_AGE (recent search only covers 7 days)
+#   fetches  last search time and the newest tweet id seen, sent as
+#            since_id so a refresh only returns new tweets
+# Likes and retweets of stored tweets are updated on every refresh (see
+# update_metrics), so engagement is not frozen at first sight; the metrics
+# table records when that last happened.
+REFRESH_INTERVAL = int(os.getenv("TWEET_REFRESH_INTERVAL", 300))
+WINDOW_SIZE = int(os.getenv("TWEET_WINDOW", 200))
+MAX_AGE = int(os.getenv("TWEET_MAX_AGE", 7 * 24 * 3600))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tweets (
+    symbol TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    created_at TEXT,
+    text TEXT NOT NULL,
+    likes INTEGER NOT NULL DEFAULT 0,
+    retweets INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (symbol, id)
+);
+CREATE TABLE IF NOT EXISTS fetches (
+    symbol TEXT PRIMARY KEY,
+    since_id INTEGER,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    symbol TEXT PRIMARY KEY,
+    refreshed_at REAL NOT NULL
+);
+"""
+
+# Tweet ids are snowflakes: milliseconds since the Twitter epoch, shifted
+TWITTER_EPOCH_MS = 1288834974657
+
+
+def _db():
+    return connect("tweets", SCHEMA)
+
+
+def _key(symbol):
+    return symbol.upper()
+
+
+def id_time(tweet_id):
+    """
+    Unix time a tweet id was issued.
+    """
+    return ((int(tweet_id) >> 22) + TWITTER_EPOCH_MS) / 1000
+
+
+def min_id(age):
+    """
+    Smallest tweet id issued within the last `age` seconds.
+    """
+    return max(0, int(time.time() * 1000 - age * 1000) - TWITTER_EPOCH_MS) << 22
+
+
+def fetch_state(symbol):
+    """
+    (since_id, fetched_at) of the last search for a symbol, or (None, 0.0).
+    """
+    try:
+        row = _db().execute("SELECT since_id, fetched_at FROM fetches WHERE symbol = ?", (_key(symbol),)).fetchone()
+        return (row[0], row[1]) if row else (None, 0.0)
+    except Exception as e:
+        logging.warning(f"Tweet store read failed: {e}")
+        return None, 0.0
+
+
+def is_stale(symbol, interval=None):
+    interval = REFRESH_INTERVAL if interval is None else interval
+    return time.time() - fetch_state(symbol)[1] >= interval
+
+
+def refresh_lock(symbol):
+    """
+    Cross-process lock held while one process refreshes a symbol.
+    """
+    name = "".join(c if c.isalnum() or c in ".-_^=" else "_" for c in _key(symbol))
+    return locked(cache_path("tweet_locks", f"{name}.lock"))
+
+
+def since_id(symbol):
+    """
+    Newest stored tweet id, if it is still inside the search window.
+    """
+    stored = fetch_state(symbol)[0]
+    if stored is None or int(stored) < min_id(MAX_AGE):
+        return None
+    return stored
+
+
+def merge(symbol, tweets):
+    """
+    Record a search: add `tweets` (dicts with id, created_at, text, likes,
+    retweets), move since_id forward and trim the window.
+    """
+    key = _key(symbol)
+    try:
+        db = _db()
+        db.execute("BEGIN")
+        db.executemany(
+            "INSERT OR REPLACE INTO tweets (symbol, id, created_at, text, likes, retweets) VALUES (?, ?, ?, ?, ?, ?)",
+            [(key, int(t["id"]), t.get("created_at"), t.get("text", ""), t.get("likes", 0), t.get("retweets", 0))
+             for t in tweets if t.get("id")]
+        )
+        newest = max([int(t["id"]) for t in tweets if t.get("id")], default=None)
+        db.execute(
+            "INSERT INTO fetches (symbol, since_id, fetched_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(symbol) DO UPDATE SET fetched_at = excluded.fetched_at, "
+            "since_id = MAX(COALESCE(since_id, 0), COALESCE(excluded.since_id, 0))",
+            (key, newest, time.time())
+        )
+        db.execute(
+            "DELETE FROM tweets WHERE symbol = ? AND (id < ? OR id NOT IN ("
+            "SELECT id FROM tweets WHERE symbol = ? ORDER BY id DESC LIMIT ?))",
+            (key, min_id(MAX_AGE), key, WINDOW_SIZE)
+        )
+        db.execute("COMMIT")
+    except Exception as e:
+        logging.warning(f"Tweet store write failed: {e}")
+        try:
+            db.execute("ROLLBACK")
+        except Exception:
+            pass
+
+
+def update_metrics(symbol, metrics):
+    """
+    Overwrite likes and retweets from {id: (likes, retweets)}.
+    """
+    key = _key(symbol)
+    try:
+        db = _db()
+        db.execute("BEGIN")
+        db.executemany(
+            "UPDATE tweets SET likes = ?, retweets = ? WHERE symbol = ? AND id = ?",
+            [(likes, retweets, key, int(i)) for i, (likes, retweets) in metrics.items()]
+        )
+        db.execute("INSERT OR REPLACE INTO metrics (symbol, refreshed_at) VALUES (?, ?)", (key, time.time()))
+        db.execute("COMMIT")
+    except Exception as e:
+        logging.warning(f"Tweet store write failed: {e}")
+        try:
+            db.execute("ROLLBACK")
+        except Exception:
+            pass
+
+
+def metrics_refreshed_at(symbol):
+    """
+    When update_metrics last ran for a symbol, or 0.0.
+    """
+    try:
+        row = _db().execute("SELECT refreshed_at FROM metrics WHERE symbol = ?", (_key(symbol),)).fetchone()
+        return row[0] if row else 0.0
+    except Exception as e:
+        logging.warning(f"Tweet store read failed: {e}")
+        return 0.0
+
+
+def window(symbol):
+    """
+    Stored tweets for a symbol, newest first.
+    """
+    try:
+        rows = _db().execute(
+            "SELECT id, created_at, text, likes, retweets FROM tweets WHERE symbol = ? AND id >= ? "
+            "ORDER BY id DESC LIMIT ?",
+            (_key(symbol), min_id(MAX_AGE), WINDOW_SIZE)
+        ).fetchall()
+    except Exception as e:
+        logging.warning(f"Tweet store read failed: {e}")
+        return []
+    return [
+        {"id": str(i), "created_at": created_at, "text": text, "likes": likes, "retweets": retweets}
+        for i, created_at, text, likes, retweets in rows
+    ]
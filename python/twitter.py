@@ -1,38 +1,66 @@
 import os
-import time
+import hashlib
+import threading
+from collections import OrderedDict
 import requests
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
-from nltk import download
+import tweet_store
+import tweet_dedup
 
-# ----------------- NLTK Setup -----------------
-try:
-    download('vader_lexicon')
-except:
-    pass
+# ----------------- VADER Setup -----------------
+_sia = None
+_sia_lock = threading.Lock()
 
-sia = SentimentIntensityAnalyzer()
-sentiment_cache = {}
+def _build_sia():
+    """
+    Build a VADER analyzer from a local lexicon, without touching the network:
+    VADER_LEXICON env path, then the NLTK data cache, then the copy bundled
+    with the vaderSentiment package. Downloads only as a last resort.
+    """
+    lexicon_path = os.getenv("VADER_LEXICON")
+    if lexicon_path and os.path.exists(lexicon_path):
+        from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+        return SentimentIntensityAnalyzer(lexicon_file=os.path.abspath(lexicon_path))
 
-# ----------------- Tweets Cache -----------------
-tweets_cache = {}  # {symbol: {"timestamp": ..., "tweets": [...] }}
-CACHE_TTL = 300  # 5 minutes
+    import nltk
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer as NltkAnalyzer
+    try:
+        nltk.data.find("sentiment/vader_lexicon.zip")
+        return NltkAnalyzer()
+    except LookupError:
+        pass
 
-# ----------------- Fetch Tweets -----------------
-def fetch_tweets(symbol: str, max_results: int = 50) -> list:
-    now = time.time()
+    try:
+        from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+        return SentimentIntensityAnalyzer()
+    except ImportError:
+        pass
 
-    # Return cached tweets if valid
-    if symbol in tweets_cache:
-        if now - tweets_cache[symbol]["timestamp"] < CACHE_TTL:
-            return tweets_cache[symbol]["tweets"]
+    nltk.download('vader_lexicon', quiet=True)
+    return NltkAnalyzer()
 
+def get_sia():
+    """
+    Return the shared VADER analyzer, building it on first use.
+    """
+    global _sia
+    if _sia is None:
+        with _sia_lock:
+            if _sia is None:
+                _sia = _build_sia()
+    return _sia
+
+# ----------------- Fetch Tweets -----------------
+def _search_recent(symbol, max_results, since_id=None):
+    """
+    One recent-search request. Returns the parsed tweets, or None when the
+    API could not be asked or answered with an error.
+    """
     url = "https://api.twitter.com/2/tweets/search/recent"
     token = os.getenv("X_BEARER_TOKEN")
 
     if not token:
         print("⚠️ Twitter token missing. Returning empty tweets.")
-        tweets_cache[symbol] = {"timestamp": now, "tweets": []}
-        return []
+        return None
 
     headers = {"Authorization": f"Bearer {token}"}
     query = f"({symbol} OR #{symbol}) (bullish OR bearish OR buy OR sell OR breakout OR crash OR dump OR moon) lang:en -is:retweet"
@@ -41,19 +69,23 @@ def fetch_tweets(symbol: str, max_results: int = 50) -> list:
         "max_results": max_results,
         "tweet.fields": "created_at,public_metrics"
     }
+    if since_id:
+        params["since_id"] = str(since_id)
 
     try:
         response = requests.get(url, headers=headers, params=params, timeout=5)
 
         if response.status_code != 200:
             print(f"Twitter API error {response.status_code} for {symbol}")
-            return tweets_cache.get(symbol, {}).get("tweets", [])
+            return None
 
         raw = response.json()
         data = raw.get("data", [])
 
-        tweets = [
+        return [
             {
+                "id": t.get("id"),
+                "created_at": t.get("created_at"),
                 "text": t.get("text", ""),
                 "likes": t.get("public_metrics", {}).get("like_count", 0),
                 "retweets": t.get("public_metrics", {}).get("retweet_count", 0)
@@ -61,24 +93,139 @@ def fetch_tweets(symbol: str, max_results: int = 50) -> list:
             for t in data
         ]
 
-        tweets_cache[symbol] = {"timestamp": now, "tweets": tweets}
-        return tweets
-
     except Exception as e:
         print(f"Twitter fetch failed for {symbol}: {e}")
-        return tweets_cache.get(symbol, {}).get("tweets", [])
+        return None
+
+
+LOOKUP_BATCH = 100  # ids per tweet lookup request
+
+def _lookup_metrics(ids: list):
+    """
+    Current (likes, retweets) of tweets by id, LOOKUP_BATCH ids per request.
+    Returns {id: (likes, retweets)} for tweets that still exist, or None
+    when a request failed.
+    """
+    url = "https://api.twitter.com/2/tweets"
+    token = os.getenv("X_BEARER_TOKEN")
+    if not token or not ids:
+        return None
+
+    headers = {"Authorization": f"Bearer {token}"}
+    metrics = {}
+    try:
+        for i in range(0, len(ids), LOOKUP_BATCH):
+            params = {"ids": ",".join(str(t) for t in ids[i:i + LOOKUP_BATCH]), "tweet.fields": "public_metrics"}
+            response = requests.get(url, headers=headers, params=params, timeout=5)
+
+            if response.status_code != 200:
+                print(f"Twitter lookup error {response.status_code}")
+                return None
+
+            for t in response.json().get("data", []):
+                public = t.get("public_metrics", {})
+                metrics[t.get("id")] = (public.get("like_count", 0), public.get("retweet_count", 0))
+        return metrics
+
+    except Exception as e:
+        print(f"Twitter lookup failed: {e}")
+        return None
+
+
+def fetch_tweets(symbol: str, max_results: int = 50) -> list:
+    """
+    Rolling window of recent tweets for a symbol, newest first, from the
+    shared tweet store. The store is refreshed at most once per
+    tweet_store.REFRESH_INTERVAL across all processes, asking the API only
+    for tweets newer than the last one seen and then re-reading likes and
+    retweets of the stored window, which keep growing after a tweet is
+    first seen.
+    """
+    if tweet_store.is_stale(symbol):
+        with tweet_store.refresh_lock(symbol):
+            # Another process may have refreshed while we waited
+            if tweet_store.is_stale(symbol):
+                fresh = _search_recent(symbol, max_results, tweet_store.since_id(symbol))
+                # Failures count as a refresh too, so the API is not hammered
+                tweet_store.merge(symbol, fresh or [])
+                if fresh is not None:
+                    metrics = _lookup_metrics([t["id"] for t in tweet_store.window(symbol)])
+                    if metrics:
+                        tweet_store.update_metrics(symbol, metrics)
+    return tweet_store.window(symbol)
+
+# ----------------- Sentiment Cache -----------------
+SENTIMENT_CACHE_SIZE = int(os.getenv("SENTIMENT_CACHE_SIZE", 20000))
+
+class SentimentCache:
+    """
+    Bounded LRU of text scores keyed by a hash of the full text, safe to
+    share between threads.
+    """
+
+    def __init__(self, max_size=SENTIMENT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(text):
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+sentiment_cache = SentimentCache()
 
 # ----------------- Sentiment Analysis -----------------
-def analyze_sentiment(text: str) -> tuple:
-    key = text[:200]
-    if key in sentiment_cache:
-        return sentiment_cache[key]
+# Scorers: "vader" (lexicon, default) or "transformer" (finance-tuned
+# classifier, see transformer_sentiment). SENTIMENT_SCORER sets the default.
+SCORERS = ("vader", "transformer")
+SENTIMENT_SCORER = os.getenv("SENTIMENT_SCORER", "vader")
+_transformer_failed = False
 
+def _score(text: str):
+    """
+    (label, strength) for one text, or None when VADER fails.
+    """
     try:
-        scores = sia.polarity_scores(text)
+        scores = get_sia().polarity_scores(text)
         compound = scores['compound']
     except:
-        return ("neutral", 0.0)
+        return None
 
     if compound >= 0.05:
         label = "positive"
@@ -86,59 +233,138 @@ def analyze_sentiment(text: str) -> tuple:
         label = "negative"
     else:
         label = "neutral"
+    return (label, abs(compound))
 
-    sentiment_cache[key] = (label, abs(compound))
-    return sentiment_cache[key]
 
-# ----------------- Aggregate Sentiment -----------------
-def aggregate_sentiment(tweets: list) -> dict:
+def get_transformer():
+    """
+    The shared transformer batcher, loaded on first use, or None when it
+    cannot be loaded (missing torch / transformers, model download or load
+    error). A failed load is remembered and never retried.
+    """
+    global _transformer_failed
+    if _transformer_failed:
+        return None
     try:
-        pos = neg = neu = 0.0
-
-        for t in tweets:
-            text = ""
-            likes = 0
-            retweets = 0
-
-            if isinstance(t, dict):
-                text = t.get("text", "")
-                likes = t.get("likes", 0)
-                retweets = t.get("retweets", 0)
-            elif isinstance(t, str):
-                text = t
-
-            label, _ = analyze_sentiment(text)
-            weight = 1 + (likes * 0.1) + (retweets * 0.2)
-
-            if label.lower() == "positive":
-                pos += weight
-            elif label.lower() == "negative":
-                neg += weight
-            else:
-                neu += weight
+        from transformer_sentiment import get_batcher
+        return get_batcher()
+    except Exception as e:
+        _transformer_failed = True
+        print(f"⚠️ Transformer sentiment unavailable ({e}). Using VADER.")
+        return None
+
 
-        directional = pos + neg
-        if directional == 0:
-            return {"bias": "neutral", "confidence": 0.0, "bullish_ratio": 0.5}
+def _score_many(texts: list, scorer: str) -> tuple:
+    """
+    (scores or None on failure, scorer that produced them) for texts that
+    missed the cache. A failed transformer batch falls back to VADER.
+    """
+    if scorer == "transformer":
+        try:
+            return get_transformer().score(texts), "transformer"
+        except Exception as e:
+            print(f"Transformer sentiment failed: {e}. Using VADER.")
+    return [_score(text) for text in texts], "vader"
 
-        bullish_ratio = pos / directional
-        if bullish_ratio > 0.65:
-            bias = "bullish"
-        elif bullish_ratio < 0.35:
-            bias = "bearish"
+
+def _resolve_scorer(scorer):
+    """
+    The scorer to use: `scorer` or SENTIMENT_SCORER, "vader" once the
+    transformer failed to load.
+    """
+    scorer = scorer or SENTIMENT_SCORER
+    if scorer not in SCORERS:
+        raise ValueError(f"scorer must be one of {SCORERS}")
+    if scorer == "transformer" and get_transformer() is None:
+        return "vader"
+    return scorer
+
+
+def analyze_sentiment(text: str, scorer: str = None) -> tuple:
+    return analyze_sentiment_batch([text], scorer)[0]
+
+
+def analyze_sentiment_batch(texts: list, scorer: str = None) -> list:
+    """
+    analyze_sentiment for many texts: each distinct text is looked up and
+    the misses are scored together, once each. Results are in input order.
+    """
+    scorer = _resolve_scorer(scorer)
+    keys = [sentiment_cache.key(f"{scorer}\0{text}") for text in texts]
+    results, missing = {}, {}
+    for key, text in zip(keys, texts):
+        if key in results or key in missing:
+            continue
+        cached = sentiment_cache.get(key)
+        if cached is None:
+            missing[key] = text
         else:
-            bias = "neutral"
+            results[key] = cached
+
+    if missing:
+        scores, used = _score_many(list(missing.values()), scorer)
+        for (key, text), value in zip(missing.items(), scores):
+            if value is None:
+                value = ("neutral", 0.0)
+            else:
+                # Fallback scores are cached as what they are
+                sentiment_cache.put(key if used == scorer else sentiment_cache.key(f"{used}\0{text}"), value)
+            results[key] = value
+    return [results[key] for key in keys]
 
-        confidence = round(abs(bullish_ratio - 0.5) * 2, 2)
+# ----------------- Aggregate Sentiment -----------------
+def tweet_weight(tweet) -> float:
+    """
+    Engagement weight of a tweet dict (plain strings weigh 1).
+    """
+    if not isinstance(tweet, dict):
+        return 1.0
+    return 1 + (tweet.get("likes", 0) * 0.1) + (tweet.get("retweets", 0) * 0.2)
 
-        return {
-            "bias": bias,
-            "confidence": confidence,
-            "bullish_ratio": round(bullish_ratio, 2)
-        }
 
-    except Exception as e:
-        print("Aggregate sentiment failed:", e)
+def sentiment_summary(pos: float, neg: float) -> dict:
+    """
+    bias / confidence / bullish_ratio from positive and negative weight.
+    """
+    directional = pos + neg
+    if directional == 0:
         return {"bias": "neutral", "confidence": 0.0, "bullish_ratio": 0.5}
 
+    bullish_ratio = pos / directional
+    if bullish_ratio > 0.65:
+        bias = "bullish"
+    elif bullish_ratio < 0.35:
+        bias = "bearish"
+    else:
+        bias = "neutral"
+
+    confidence = round(abs(bullish_ratio - 0.5) * 2, 2)
+
+    return {
+        "bias": bias,
+        "confidence": confidence,
+        "bullish_ratio": round(bullish_ratio, 2)
+    }
+
+
+def aggregate_sentiment(tweets: list, scorer: str = None) -> dict:
+    """
+    Engagement-weighted bias of a whole tweet list, scored with `scorer`
+    ("vader" or "transformer"; SENTIMENT_SCORER by default). Near-duplicates
+    count once and distinct texts are scored in one batch.
+    sentiment_state.update is the incremental, time-decayed version.
+    """
+    try:
+        # Copy-pasted spam counts once, with the copies' engagement
+        tweets = tweet_dedup.collapse(tweets)
+        scores = analyze_sentiment_batch([t.get("text", "") for t in tweets], scorer)
+
+        totals = {"positive": 0.0, "negative": 0.0}
+        for t, (label, _) in zip(tweets, scores):
+            if label in totals:
+                totals[label] += tweet_weight(t)
+        return sentiment_summary(totals["positive"], totals["negative"])
 
+    except Exception as e:
+        print("Aggregate sentiment failed:", e)
+        return {"bias": "neutral", "confidence": 0.0, "bullish_ratio": 0.5}